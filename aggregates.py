@@ -0,0 +1,244 @@
+"""
+Maintenance of the materialized rollup tables.
+Every write path that inserts expenses or revenues calls into this module
+inside its own transaction, so the rollups commit (or roll back) together
+with the rows they summarize.
+"""
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+from sqlalchemy import func, case
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, User, Seller, ProjectTotals, DailyExpenseTotal, DailySeriesTotal, ItemCatalog, SellerCatalog
+from queries import project_totals_query, expense_history, search_key
+
+CENTS = Decimal('0.01')
+# Catalog rows inserted per statement by rebuild_catalogs.
+REBUILD_BATCH_SIZE = 5000
+
+
+def money(value):
+    """
+    Rounds an amount to cents, half away from zero, as PostgreSQL stores a
+    Numeric(…, 2). Amounts are rounded with this before they are stored, so
+    the rollups add exactly what the rows hold.
+    """
+    return Decimal(str(value)).quantize(CENTS, rounding=ROUND_HALF_UP)
+
+
+def current_data_version(user_id):
+    """The user's data version; cache keys built from it change on every write."""
+    return db.session.query(User.data_version).filter(User.id == user_id).scalar() or 0
+
+
+def bump_data_version(user_ids):
+    """Invalidates every cached result derived from these users' data."""
+    user_ids = set(user_ids)
+    if user_ids:
+        db.session.execute(
+            db.update(User).where(User.id.in_(user_ids)).values(data_version=User.data_version + 1)
+        )
+
+
+def create_project_totals(project):
+    """Adds the empty rollup row for a newly created project."""
+    db.session.flush()
+    db.session.add(ProjectTotals(project_id=project.id, user_id=project.user_id,
+                                 total_expenses=0, total_revenues=0,
+                                 expense_count=0, revenue_count=0))
+    bump_data_version([project.user_id])
+
+
+def refresh_project_totals(project_ids):
+    """Recomputes the rollup rows for the given projects from the base tables."""
+    project_ids = list(project_ids)
+    if not project_ids:
+        return
+    rows = project_totals_query(project_ids=project_ids).all()
+    ProjectTotals.query.filter(ProjectTotals.project_id.in_(project_ids)).delete(synchronize_session=False)
+    db.session.add_all([ProjectTotals(**row._asdict()) for row in rows])
+
+
+def _bump_project_totals(amount_column, count_column, deltas):
+    """Applies {project_id: (amount, count)} increments to project_totals."""
+    missing = []
+    for project_id, (amount, count) in deltas.items():
+        result = db.session.execute(
+            db.update(ProjectTotals)
+            .where(ProjectTotals.project_id == project_id)
+            .values({amount_column: getattr(ProjectTotals, amount_column) + amount,
+                     count_column: getattr(ProjectTotals, count_column) + count})
+        )
+        if result.rowcount == 0:
+            missing.append(project_id)
+    # Projects created before the rollup existed (or rebuilt out of band) are
+    # recomputed from scratch; the caller has already flushed its new rows.
+    refresh_project_totals(missing)
+
+
+def _bump_daily_totals(model, keys, deltas):
+    """Upserts {key values: (amount, count)} increments into a daily rollup keyed by `keys`."""
+    if not deltas:
+        return
+    values = [{**dict(zip(keys, key)), 'total': amount, 'count': count}
+              for key, (amount, count) in deltas.items()]
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        stmt = insert(model).values(values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={'total': model.total + stmt.excluded.total,
+                  'count': model.count + stmt.excluded.count},
+        )
+        db.session.execute(stmt)
+        return
+    for value in values:
+        result = db.session.execute(
+            db.update(model)
+            .where(*(getattr(model, key) == value[key] for key in keys))
+            .values(total=model.total + value['total'], count=model.count + value['count'])
+        )
+        if result.rowcount == 0:
+            db.session.execute(db.insert(model).values(value))
+
+
+def backfill_daily_totals(user_id=None):
+    """
+    Rebuilds daily_expense_totals and daily_series_totals from the live and
+    archived expenses.
+    """
+    expense = expense_history().c
+    day = func.date(expense.created_at)
+    for model, keys in ((DailyExpenseTotal, [expense.user_id]),
+                        (DailySeriesTotal, [expense.user_id, expense.project_id, expense.expense_type])):
+        delete = db.delete(model)
+        daily = db.select(*keys, day, func.sum(expense.total_amount), func.count(expense.id)) \
+            .where(expense.created_at.isnot(None)) \
+            .group_by(*keys, day)
+        if user_id is not None:
+            delete = delete.where(model.user_id == user_id)
+            daily = daily.where(expense.user_id == user_id)
+        db.session.execute(delete)
+        db.session.execute(db.insert(model).from_select([key.name for key in keys] + ['day', 'total', 'count'],
+                                                        daily))
+
+
+def _upsert_catalog(model, keys, values):
+    """Inserts catalog rows; existing ones get their use_count added and last_used_at moved forward."""
+    if not values:
+        return
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        stmt = insert(model).values(values)
+        newer = model.last_used_at.is_(None) | (stmt.excluded.last_used_at > model.last_used_at)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={'use_count': model.use_count + stmt.excluded.use_count,
+                  'last_used_at': case((newer, stmt.excluded.last_used_at), else_=model.last_used_at)},
+        )
+        db.session.execute(stmt)
+        return
+    for value in values:
+        existing = db.session.get(model, tuple(value[key] for key in keys))
+        if existing is None:
+            db.session.add(model(**value))
+            continue
+        existing.use_count += value['use_count']
+        if existing.last_used_at is None or value['last_used_at'] > existing.last_used_at:
+            existing.last_used_at = value['last_used_at']
+
+
+def _bump_catalogs(rows):
+    """Adds the items and sellers of new expense rows to the per-user catalogs."""
+    items, sellers = {}, {}
+    for row in rows:
+        for usage in (items.setdefault((row['user_id'], row['item_name']), [0, row['created_at']]),
+                      sellers.setdefault((row['user_id'], row['seller_id']), [0, row['created_at']])):
+            usage[0] += 1
+            usage[1] = max(usage[1], row['created_at'])
+    _upsert_catalog(ItemCatalog, ['user_id', 'name'], [
+        {'user_id': user_id, 'name': name, 'name_key': search_key(name), 'use_count': count, 'last_used_at': last}
+        for (user_id, name), (count, last) in items.items()
+    ])
+    seller_ids = {seller_id for _, seller_id in sellers}
+    details = {seller_id: (name, gstn) for seller_id, name, gstn in
+               db.session.query(Seller.id, Seller.name, Seller.gstn).filter(Seller.id.in_(seller_ids))} \
+        if seller_ids else {}
+    _upsert_catalog(SellerCatalog, ['user_id', 'seller_id'], [
+        {'user_id': user_id, 'seller_id': seller_id, 'name': details[seller_id][0],
+         'name_key': search_key(details[seller_id][0]), 'gstn': details[seller_id][1],
+         'use_count': count, 'last_used_at': last}
+        for (user_id, seller_id), (count, last) in sellers.items()
+    ])
+
+
+def _insert_catalog_rows(model, query, row_values):
+    """Inserts the rows of `query`, mapped by `row_values`, in batches of REBUILD_BATCH_SIZE."""
+    result = db.session.execute(query.execution_options(yield_per=REBUILD_BATCH_SIZE))
+    for rows in result.partitions():
+        db.session.execute(db.insert(model), [row_values(*row) for row in rows])
+
+
+def rebuild_catalogs(user_id=None):
+    """
+    Rebuilds item_catalog and seller_catalog from the live and archived
+    expenses. Search keys are computed in Python, as on insert.
+    """
+    expense = expense_history().c
+    item_delete, seller_delete = db.delete(ItemCatalog), db.delete(SellerCatalog)
+    items = db.select(
+        expense.user_id, expense.item_name, func.count(expense.id), func.max(expense.created_at),
+    ).group_by(expense.user_id, expense.item_name)
+    sellers = db.select(
+        expense.user_id, Seller.id, Seller.name, Seller.gstn, func.count(expense.id), func.max(expense.created_at),
+    ).join(Seller, Seller.id == expense.seller_id) \
+     .group_by(expense.user_id, Seller.id, Seller.name, Seller.gstn)
+    if user_id is not None:
+        item_delete = item_delete.where(ItemCatalog.user_id == user_id)
+        seller_delete = seller_delete.where(SellerCatalog.user_id == user_id)
+        items = items.where(expense.user_id == user_id)
+        sellers = sellers.where(expense.user_id == user_id)
+    db.session.execute(item_delete)
+    db.session.execute(seller_delete)
+    _insert_catalog_rows(ItemCatalog, items, lambda owner_id, name, count, last: {
+        'user_id': owner_id, 'name': name, 'name_key': search_key(name), 'use_count': count, 'last_used_at': last})
+    _insert_catalog_rows(SellerCatalog, sellers, lambda owner_id, seller_id, name, gstn, count, last: {
+        'user_id': owner_id, 'seller_id': seller_id, 'name': name, 'name_key': search_key(name), 'gstn': gstn,
+        'use_count': count, 'last_used_at': last})
+
+
+def record_expenses(rows):
+    """
+    Folds newly inserted expenses into the rollups and catalogs.
+    `rows` is a list of mappings with user_id, project_id, expense_type,
+    item_name, seller_id, total_amount and created_at. Call after the expenses are
+    flushed, before the commit.
+    """
+    project_deltas = defaultdict(lambda: [Decimal('0'), 0])
+    daily_deltas = defaultdict(lambda: [Decimal('0'), 0])
+    series_deltas = defaultdict(lambda: [Decimal('0'), 0])
+    for row in rows:
+        amount = money(row['total_amount'])
+        day = row['created_at'].date()
+        for delta in (project_deltas[row['project_id']],
+                      daily_deltas[(row['user_id'], day)],
+                      series_deltas[(row['user_id'], day, row['project_id'], row['expense_type'])]):
+            delta[0] += amount
+            delta[1] += 1
+    _bump_project_totals('total_expenses', 'expense_count', project_deltas)
+    _bump_daily_totals(DailyExpenseTotal, ['user_id', 'day'], daily_deltas)
+    _bump_daily_totals(DailySeriesTotal, ['user_id', 'day', 'project_id', 'expense_type'], series_deltas)
+    _bump_catalogs(rows)
+    bump_data_version(user_id for user_id, _ in daily_deltas)
+
+
+def record_revenues(rows):
+    """Same as record_expenses, for revenue rows (user_id, project_id, total_estimated_revenue)."""
+    deltas = defaultdict(lambda: [Decimal('0'), 0])
+    for row in rows:
+        delta = deltas[row['project_id']]
+        delta[0] += money(row['total_estimated_revenue'])
+        delta[1] += 1
+    _bump_project_totals('total_revenues', 'revenue_count', deltas)
+    bump_data_version(row['user_id'] for row in rows)
@@ -0,0 +1,140 @@
+"""
+Read-only JSON API for dashboards, under /api.
+
+Views read through the app's pooled db.session using the same query
+builders as the HTML pages, so both return the same rows. Every response
+carries a weak ETag built from the user's data_version: a poll sending
+If-None-Match costs one primary-key lookup on a pooled connection and an
+empty 304 until the user's data changes.
+
+The views are synchronous on purpose. Flask runs an async view in a fresh
+event loop per request, and an async engine's pooled connections cannot
+cross loops, so async views could only open a new connection per request.
+That cost more than the blocking queries it would replace, which are short
+indexed reads. Concurrency comes from gunicorn's threads, as for the pages.
+"""
+import hashlib
+from datetime import date
+from functools import wraps
+from flask import Blueprint, Response, jsonify, request, abort
+from flask_login import current_user
+from werkzeug.exceptions import HTTPException
+from models import db
+from forms import LedgerFilterForm
+from queries import (expense_ledger_query, keyset_query, split_page, ledger_row_to_dict, project_report_query,
+                     daily_totals_query, forecast_series_queries, cached_project_choices,
+                     LEDGER_PAGE_SIZE, LEDGER_MAX_PAGE_SIZE)
+from aggregates import current_data_version
+from jobs import forecast_jobs, forecast_key, forecast_window
+from forecast_routes import forecast_payload
+
+api = Blueprint('api', __name__, url_prefix='/api')
+
+
+@api.errorhandler(HTTPException)
+def json_error(e):
+    return jsonify({'error': e.description}), e.code
+
+
+def _etag(*parts):
+    return hashlib.sha1(':'.join(str(part) for part in parts).encode()).hexdigest()[:24]
+
+
+def api_view(view):
+    """
+    Wraps an API view: requires a logged-in user and answers If-None-Match
+    with a 304 when the user's data is unchanged. The view receives the
+    user id and data version and returns a
+    dict to send as JSON, or any other Flask return value (a Response, a
+    (body, status) tuple) to send as-is without an ETag.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not current_user.is_authenticated:
+            return jsonify({'error': 'Authentication required.'}), 401
+        user_id = current_user.id
+        version = current_data_version(user_id)
+        etag = _etag(user_id, version, request.full_path)
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            result = view(user_id, version, *args, **kwargs)
+            if not isinstance(result, dict):
+                return result
+            response = jsonify(result)
+        response.set_etag(etag, weak=True)
+        # Browsers may keep the response but must revalidate it on every poll.
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return wrapper
+
+
+def _all(query):
+    return db.session.execute(query.statement).all()
+
+
+@api.route('/projects')
+@api_view
+def project_totals(user_id, version):
+    """Per-project totals from the project_totals rollup."""
+    rows = _all(project_report_query(user_id))
+    projects = []
+    for row in rows:
+        expenses, revenues = row.total_expenses, row.total_revenues
+        projects.append({'id': row.id, 'name': row.name, 'total_expenses': str(expenses),
+                         'total_revenues': str(revenues), 'profit': str(revenues - expenses)})
+    return {'projects': projects}
+
+
+@api.route('/expenses')
+@api_view
+def expense_ledger(user_id, version):
+    """One ledger page; same filters, cursor and limit as /expenses/ledger."""
+    filter_form = LedgerFilterForm(request.args)
+    filter_form.project_id.choices = [(0, 'All projects')] + cached_project_choices(user_id, request.args.get('project_id', type=int))
+    if request.args and not filter_form.validate():
+        return jsonify({'errors': filter_form.errors}), 400
+    limit = min(request.args.get('limit', LEDGER_PAGE_SIZE, type=int), LEDGER_MAX_PAGE_SIZE)
+    if limit < 1:
+        abort(400, 'limit must be at least 1.')
+    try:
+        query = keyset_query(expense_ledger_query(user_id, **filter_form.filters()),
+                             request.args.get('cursor'), limit)
+    except ValueError:
+        abort(400, 'Invalid cursor.')
+    rows, next_cursor = split_page(_all(query), limit)
+    return {'expenses': [ledger_row_to_dict(row) for row in rows], 'next_cursor': next_cursor}
+
+
+@api.route('/daily')
+@api_view
+def daily_series(user_id, version):
+    """Spending per day (days without expenses are omitted), optionally within date_from..date_to."""
+    try:
+        date_from, date_to = (date.fromisoformat(request.args[name]) if request.args.get(name) else None
+                              for name in ('date_from', 'date_to'))
+    except ValueError:
+        abort(400, 'Dates must be YYYY-MM-DD.')
+    rows = _all(daily_totals_query(user_id, date_from, date_to))
+    return {'days': [{'day': row.day.isoformat(), 'total': str(row.total), 'count': row.count} for row in rows]}
+
+
+@api.route('/forecast')
+@api_view
+def forecast(user_id, version):
+    """The cached forecast, scheduling a background fit when there is none."""
+    cache_key = forecast_key(user_id, version)
+    status, result = forecast_jobs.status(cache_key) or (None, None)
+    if status is None:
+        since, end_day = forecast_window()
+        series = {kind: _all(query) for kind, query in forecast_series_queries(user_id, since).items()}
+        status = forecast_jobs.schedule(cache_key, series, end_day)
+    if status == 'ready':
+        return {'status': status, **forecast_payload(result)}
+    # Not final for this data version: keep it out of conditional requests.
+    payload = {'status': status}
+    if status == 'failed':
+        payload['error'] = result['error']
+    response = jsonify(payload)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
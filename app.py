@@ -4,18 +4,36 @@ Initializes the Flask application, database, migration engine, and login manager
 """
 from flask import Flask
 from config import Config
-from models import db, User  # Import the new User model
+from models import db
+from cache import forecast_cache, user_cache, fragment_cache
+from queries import cached_user
+from jobs import forecast_jobs
+from instrumentation import perf_monitor
+from security import password_hasher, login_limiter
 from routes import routes
+from forecast_routes import forecast_routes
+from api import api
+from commands import register_commands
 from flask_migrate import Migrate
 from flask_login import LoginManager
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 # --- Application Factory ---
 app = Flask(__name__)
 app.config.from_object(Config)
+if app.config['TRUSTED_PROXIES']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXIES'], x_proto=app.config['TRUSTED_PROXIES'])
 
 # --- Initialize Extensions ---
 db.init_app(app)
 migrate = Migrate(app, db)
+forecast_cache.init_app(app)
+user_cache.init_app(app)
+fragment_cache.init_app(app)
+forecast_jobs.init_app(app)
+perf_monitor.init_app(app)
+password_hasher.init_app(app)
+login_limiter.init_app(app)
 
 # --- Flask-Login Configuration ---
 login_manager = LoginManager()
@@ -26,9 +44,14 @@ login_manager.login_message_category = 'info' # Optional: for styling flash mess
 
 @login_manager.user_loader
 def load_user(user_id):
-
-    return User.query.get(int(user_id))
+    # Runs on every authenticated request; served from user_cache when possible.
+    return cached_user(int(user_id))
 
 # --- Register Blueprints ---
 app.register_blueprint(routes)
+app.register_blueprint(forecast_routes)
+app.register_blueprint(api)
+
+# --- Register CLI Commands ---
+register_commands(app)
 
@@ -0,0 +1,164 @@
+"""
+Archiving of closed fiscal years.
+
+Expenses of closed Indian fiscal years (April to March) are moved out of the
+expense table into expense_archive, so the pages that read only recent data
+(the ledger, the per-user indexes) touch the open years alone. On PostgreSQL
+both tables are range partitioned by month and whole monthly partitions are
+detached from one and attached to the other, which moves no rows; elsewhere
+the rows are copied and deleted in one transaction.
+
+The rollups (project_totals, the daily totals, the catalogs) are not
+touched: they already include archived expenses, and their rebuild queries
+read both tables through queries.expense_history.
+"""
+import re
+from datetime import date, datetime
+from sqlalchemy import select, text
+from models import db, Expense, ExpenseArchive
+from aggregates import bump_data_version
+
+FISCAL_YEAR_START_MONTH = 4
+PARTITION_NAME = re.compile(r'^expense_y(\d{4})m(\d{2})$')
+
+
+def fiscal_year_start(day):
+    """First day of the fiscal year containing `day` (1 April)."""
+    year = day.year if day.month >= FISCAL_YEAR_START_MONTH else day.year - 1
+    return date(year, FISCAL_YEAR_START_MONTH, 1)
+
+
+def archive_boundary(today, keep_years=0):
+    """Expenses before this date belong to fiscal years that can be archived."""
+    start = fiscal_year_start(today)
+    return start.replace(year=start.year - keep_years)
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _partition_name(month):
+    return f'expense_y{month.year}m{month.month:02d}'
+
+
+def _is_partitioned():
+    return db.session.get_bind().dialect.name == 'postgresql'
+
+
+def _partitions(parent):
+    """{month: partition name} of the monthly partitions attached to `parent`."""
+    rows = db.session.execute(text(
+        "SELECT child.relname FROM pg_inherits"
+        " JOIN pg_class child ON child.oid = pg_inherits.inhrelid"
+        " WHERE pg_inherits.inhparent = CAST(:parent AS regclass)"
+    ), {'parent': parent})
+    partitions = {}
+    for name, in rows:
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+
+def create_expense_partitions(today, months_ahead=3):
+    """
+    PostgreSQL only: creates the monthly expense partitions from the current
+    month to `months_ahead` months ahead. Returns the names created. Rows for
+    months without a partition land in expense_default, so run this (e.g.
+    monthly) before the months arrive.
+    """
+    if not _is_partitioned():
+        return []
+    existing = set(_partitions('expense').values()) | set(_partitions('expense_archive').values())
+    created = []
+    month = today.replace(day=1)
+    for _ in range(months_ahead + 1):
+        following = _add_months(month, 1)
+        name = _partition_name(month)
+        if name not in existing:
+            db.session.execute(text(
+                f"CREATE TABLE {name} PARTITION OF expense FOR VALUES FROM ('{month}') TO ('{following}')"
+            ))
+            created.append(name)
+        month = following
+    return created
+
+
+def _move_partitions(before):
+    """
+    Moves the monthly partitions that end on or before `before` to the
+    archive, committing after each one: DETACH holds an exclusive lock on
+    expense, so it is released after every partition rather than at the end.
+    """
+    moved = 0
+    for month, name in sorted(_partitions('expense').items()):
+        following = _add_months(month, 1)
+        if datetime.combine(following, datetime.min.time()) > before:
+            continue
+        count = db.session.execute(text(f"SELECT COUNT(*) FROM {name}")).scalar()
+        db.session.execute(text(f"ALTER TABLE expense DETACH PARTITION {name}"))
+        db.session.execute(text(
+            f"ALTER TABLE expense_archive ATTACH PARTITION {name} FOR VALUES FROM ('{month}') TO ('{following}')"
+        ))
+        db.session.commit()
+        moved += count
+    return moved
+
+
+def _move_rows(before):
+    """Copies expenses created before `before` to the archive and deletes them."""
+    columns = [column.name for column in Expense.__table__.columns]
+    old = Expense.created_at < before
+    db.session.execute(db.insert(ExpenseArchive).from_select(
+        columns, select(*[Expense.__table__.c[name] for name in columns]).where(old)))
+    return db.session.execute(db.delete(Expense).where(old)).rowcount
+
+
+def archive_expenses(before):
+    """
+    Moves every expense created before `before` (a fiscal year start) to
+    expense_archive and bumps the affected users' data versions. Returns the
+    number of expenses moved. Commits as it goes: whole partitions one at a
+    time, then the remaining rows together with the version bump.
+    """
+    before = datetime.combine(before, datetime.min.time())
+    user_ids = [user_id for user_id, in
+                db.session.query(Expense.user_id).filter(Expense.created_at < before).distinct()]
+    if not user_ids:
+        return 0
+    moved = _move_partitions(before) if _is_partitioned() else 0
+    # Rows outside any monthly partition (PostgreSQL's default partition) or
+    # in the single table elsewhere.
+    moved += _move_rows(before)
+    # The ledger no longer lists these rows by default.
+    bump_data_version(user_ids)
+    db.session.commit()
+    return moved
+
+
+def move_archive_to_tablespace(tablespace):
+    """
+    PostgreSQL only: moves the archived monthly partitions that are not in
+    `tablespace` yet into it, one partition per transaction. SET TABLESPACE
+    rewrites the partition, so this runs apart from archive_expenses and
+    locks only the archive partition being moved, never expense. Returns the
+    names moved.
+    """
+    if not _is_partitioned():
+        return []
+    current = dict(db.session.execute(text(
+        "SELECT child.relname, COALESCE(space.spcname, '') FROM pg_inherits"
+        " JOIN pg_class child ON child.oid = pg_inherits.inhrelid"
+        " LEFT JOIN pg_tablespace space ON space.oid = child.reltablespace"
+        " WHERE pg_inherits.inhparent = CAST('expense_archive' AS regclass)"
+    )).all())
+    moved = []
+    for name in sorted(_partitions('expense_archive').values()):
+        if current.get(name) == tablespace:
+            continue
+        db.session.execute(text(f'ALTER TABLE {name} SET TABLESPACE "{tablespace}"'))
+        db.session.commit()
+        moved.append(name)
+    return moved
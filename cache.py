@@ -0,0 +1,246 @@
+"""
+Small key/value caches with LRU + TTL eviction.
+
+Two backends are available:
+- 'memory': an in-process OrderedDict. Fastest, but each gunicorn worker
+  keeps its own copy.
+- 'sqlite': a local SQLite file shared by every worker on the host.
+
+Cache keys should carry a data version (see aggregates.current_data_version)
+so writes invalidate entries by making them unreachable; eviction then
+reclaims the space.
+
+A cache is an optimisation only: backend errors (e.g. a locked SQLite file)
+are logged and treated as misses instead of failing the request.
+"""
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+log = logging.getLogger('expensepro.cache')
+
+
+class MemoryCache:
+    def __init__(self, max_entries=1024, ttl=3600, max_bytes=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # Optional bound on the pickled size of all values together.
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def _pop(self, key):
+        self._entries.pop(key, None)
+        self._total_bytes -= self._sizes.pop(key, 0)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + (ttl or self.ttl)
+        size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)) if self.max_bytes else 0
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (expires_at, value)
+            self._sizes[key] = size
+            self._total_bytes += size
+            # A value larger than max_bytes on its own is not kept at all.
+            while len(self._entries) > self.max_entries or \
+                    (self.max_bytes and self._total_bytes > self.max_bytes):
+                self._pop(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._total_bytes = 0
+
+
+class SQLiteCache:
+    """
+    Cache stored in a SQLite file so all workers on a host share entries.
+    Values are pickled; only store data produced by this application.
+
+    Reads do not write: accessed_at, which drives LRU eviction, is refreshed
+    at most every ACCESS_REFRESH seconds per entry, so hits stay read-only
+    transactions that do not take the file's write lock.
+    """
+
+    ACCESS_REFRESH = 60
+
+    def __init__(self, path, max_entries=1024, ttl=3600, max_bytes=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                ' key TEXT PRIMARY KEY, value BLOB NOT NULL,'
+                ' expires_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_cache_accessed_at ON cache (accessed_at)')
+
+    @contextmanager
+    def _connect(self):
+        # One connection per thread, reopened in a forked child: sqlite3
+        # connections must not be shared across threads or a fork.
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        with conn:
+            yield conn
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute('SELECT value, expires_at, accessed_at FROM cache WHERE key = ?',
+                               (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                # Expired rows are removed by the next set.
+                return None
+            if row[2] < now - self.ACCESS_REFRESH:
+                conn.execute('UPDATE cache SET accessed_at = ? WHERE key = ?', (now, key))
+        return pickle.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)',
+                (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), now + (ttl or self.ttl), now),
+            )
+            conn.execute('DELETE FROM cache WHERE expires_at < ?', (now,))
+            conn.execute(
+                'DELETE FROM cache WHERE key IN ('
+                ' SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,),
+            )
+            if self.max_bytes:
+                # Least recently used first, beyond a running total of max_bytes.
+                conn.execute(
+                    'DELETE FROM cache WHERE key IN ('
+                    ' SELECT key FROM (SELECT key, SUM(LENGTH(value)) OVER'
+                    '  (ORDER BY accessed_at DESC ROWS UNBOUNDED PRECEDING) AS running FROM cache)'
+                    ' WHERE running > ?)',
+                    (self.max_bytes,),
+                )
+
+    def delete(self, key):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM cache')
+
+
+class Cache:
+    """
+    Configured from app.config like the other extensions:
+
+        forecast_cache = Cache('FORECAST_CACHE')
+        forecast_cache.init_app(app)
+
+    reads FORECAST_CACHE_BACKEND ('memory' or 'sqlite'), FORECAST_CACHE_PATH,
+    FORECAST_CACHE_MAX_ENTRIES, FORECAST_CACHE_MAX_BYTES (optional) and
+    FORECAST_CACHE_TTL (seconds).
+
+    Hits and misses are counted per process and exported by /metrics.
+    """
+
+    # Every cache created, for the metrics endpoint.
+    instances = []
+
+    def __init__(self, config_prefix):
+        self.config_prefix = config_prefix
+        self.backend = MemoryCache()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        Cache.instances.append(self)
+
+    def init_app(self, app):
+        prefix = self.config_prefix
+        backend = app.config.get(f'{prefix}_BACKEND', 'memory')
+        max_entries = app.config.get(f'{prefix}_MAX_ENTRIES', 1024)
+        max_bytes = app.config.get(f'{prefix}_MAX_BYTES')
+        ttl = app.config.get(f'{prefix}_TTL', 3600)
+        if backend == 'memory':
+            self.backend = MemoryCache(max_entries=max_entries, ttl=ttl, max_bytes=max_bytes)
+        elif backend == 'sqlite':
+            path = app.config.get(f'{prefix}_PATH') or os.path.join(app.instance_path, f'{prefix.lower()}.sqlite')
+            self.backend = SQLiteCache(path, max_entries=max_entries, ttl=ttl, max_bytes=max_bytes)
+        else:
+            raise ValueError(f"Unknown {prefix}_BACKEND: {backend!r}")
+
+    @property
+    def name(self):
+        return self.config_prefix.lower().replace('_cache', '')
+
+    def get(self, key):
+        try:
+            value = self.backend.get(key)
+        except sqlite3.Error:
+            log.warning('%s cache read failed; treating it as a miss', self.name, exc_info=True)
+            value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        try:
+            self.backend.set(key, value, ttl)
+        except sqlite3.Error:
+            log.warning('%s cache write failed', self.name, exc_info=True)
+
+    def delete(self, key):
+        # Callers rely on versioned keys or short TTLs, so a failed delete
+        # only leaves an entry to expire.
+        try:
+            self.backend.delete(key)
+        except sqlite3.Error:
+            log.warning('%s cache delete failed', self.name, exc_info=True)
+
+    def clear(self):
+        self.backend.clear()
+
+
+forecast_cache = Cache('FORECAST_CACHE')
+# Login users and project choices, so routine requests skip those lookups.
+# Kept in memory with a short TTL (see Config.USER_CACHE_BACKEND).
+user_cache = Cache('USER_CACHE')
+# Rendered page fragments (see fragments.py).
+fragment_cache = Cache('FRAGMENT_CACHE')
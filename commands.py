@@ -0,0 +1,139 @@
+"""
+Flask CLI commands for maintenance tasks (`flask <command>`).
+"""
+from datetime import datetime
+import click
+from flask import current_app
+from sqlalchemy import func
+from models import db, User, Project, Expense, DailyExpenseTotal
+from aggregates import refresh_project_totals, backfill_daily_totals, rebuild_catalogs, bump_data_version
+from forecasting import MIN_EXPENSES
+from queries import forecast_series_queries
+from jobs import precompute_forecasts, forecast_key, forecast_window, forecast_rows
+from importer import iter_rows, import_expenses, DEFAULT_CHUNK_SIZE
+from archive import archive_boundary, archive_expenses, create_expense_partitions, move_archive_to_tablespace
+
+
+def _invalidate_cached_pages(user_id=None):
+    """Bumps data_version after a rebuild, so cached pages and API ETags are refreshed."""
+    if user_id is not None:
+        bump_data_version([user_id])
+    else:
+        db.session.execute(db.update(User).values(data_version=User.data_version + 1))
+
+
+@click.command('rebuild-project-totals')
+@click.option('--user-id', type=int, help='Only rebuild projects owned by this user.')
+def rebuild_project_totals(user_id):
+    """Recompute the project_totals rollup from the expense and revenue tables."""
+    query = db.session.query(Project.id)
+    if user_id is not None:
+        query = query.filter(Project.user_id == user_id)
+    project_ids = [project_id for project_id, in query]
+    refresh_project_totals(project_ids)
+    _invalidate_cached_pages(user_id)
+    db.session.commit()
+    click.echo(f"Rebuilt totals for {len(project_ids)} project(s).")
+
+
+@click.command('backfill-daily-totals')
+@click.option('--user-id', type=int, help='Only backfill this user.')
+def backfill_daily_totals_command(user_id):
+    """Rebuild the daily_expense_totals and daily_series_totals tables used by the forecast."""
+    backfill_daily_totals(user_id)
+    _invalidate_cached_pages(user_id)
+    db.session.commit()
+    click.echo("Daily expense totals rebuilt.")
+
+
+@click.command('rebuild-catalogs')
+@click.option('--user-id', type=int, help='Only rebuild this user.')
+def rebuild_catalogs_command(user_id):
+    """Rebuild the item and seller catalogs behind the report and type-ahead."""
+    rebuild_catalogs(user_id)
+    _invalidate_cached_pages(user_id)
+    db.session.commit()
+    click.echo("Item and seller catalogs rebuilt.")
+
+
+@click.command('precompute-forecasts')
+@click.option('--workers', type=int, help='Parallel fits (default: one per CPU core).')
+def precompute_forecasts_command(workers):
+    """Fit and cache forecasts for every user with enough history (nightly job)."""
+    if current_app.config['FORECAST_CACHE_BACKEND'] == 'memory':
+        raise click.UsageError("FORECAST_CACHE_BACKEND=memory is private to this process; "
+                               "use the 'sqlite' backend so web workers can read the results.")
+    since, end_day = forecast_window()
+    eligible = db.session.query(DailyExpenseTotal.user_id) \
+        .filter(DailyExpenseTotal.day >= since) \
+        .group_by(DailyExpenseTotal.user_id) \
+        .having(func.sum(DailyExpenseTotal.count) >= MIN_EXPENSES)
+    versions = db.session.query(User.id, User.data_version).filter(User.id.in_(eligible)).all()
+    jobs = []
+    for user_id, version in versions:
+        series = {kind: query.all() for kind, query in forecast_series_queries(user_id, since).items()}
+        jobs.append((forecast_key(user_id, version), forecast_rows(series)))
+    succeeded, failed = precompute_forecasts(jobs, end_day, workers)
+    click.echo(f"Precomputed {succeeded} forecast(s); {failed} failed.")
+
+
+@click.command('import-expenses')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--username', required=True, help='Owner of the imported expenses.')
+@click.option('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, show_default=True,
+              help='Rows validated, inserted and committed together.')
+def import_expenses_command(path, username, chunk_size):
+    """Bulk-import expenses from a CSV or Excel (.xlsx) file."""
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.BadParameter(f"No user named {username!r}.", param_hint='--username')
+    with open(path, 'rb') as stream:
+        try:
+            report = import_expenses(user.id, iter_rows(stream, path), chunk_size)
+        except (ValueError, UnicodeDecodeError) as e:
+            raise click.ClickException(str(e))
+    for row_number, message in report.errors:
+        click.echo(f"row {row_number}: {message}", err=True)
+    click.echo(f"Imported {report.inserted} expense(s); {len(report.errors)} row(s) rejected.")
+
+
+@click.command('archive-expenses')
+@click.option('--keep-years', type=int, default=0, show_default=True,
+              help='Closed fiscal years to keep live besides the current one.')
+@click.option('--tablespace', help='PostgreSQL tablespace to move the archived partitions to afterwards '
+                                   '(default: EXPENSE_ARCHIVE_TABLESPACE).')
+@click.option('--dry-run', is_flag=True, help='Only count the expenses that would be archived.')
+def archive_expenses_command(keep_years, tablespace, dry_run):
+    """Move expenses of closed fiscal years (April to March) to expense_archive."""
+    before = archive_boundary(datetime.utcnow().date(), keep_years)
+    if dry_run:
+        count = db.session.query(func.count(Expense.id)) \
+            .filter(Expense.created_at < datetime.combine(before, datetime.min.time())).scalar()
+        click.echo(f"{count} expense(s) created before {before} would be archived.")
+        return
+    moved = archive_expenses(before)
+    click.echo(f"Archived {moved} expense(s) created before {before}.")
+    # A separate step: rewriting partitions must not hold the lock on expense.
+    tablespace = tablespace or current_app.config.get('EXPENSE_ARCHIVE_TABLESPACE')
+    if tablespace:
+        relocated = move_archive_to_tablespace(tablespace)
+        click.echo(f"Moved {len(relocated)} archived partition(s) to tablespace {tablespace}.")
+
+
+@click.command('create-expense-partitions')
+@click.option('--months', type=int, default=3, show_default=True, help='Months ahead to create.')
+def create_expense_partitions_command(months):
+    """Create the upcoming monthly expense partitions (PostgreSQL; run monthly)."""
+    created = create_expense_partitions(datetime.utcnow().date(), months)
+    db.session.commit()
+    click.echo(f"Created {len(created)} partition(s){': ' + ', '.join(created) if created else ''}.")
+
+
+def register_commands(app):
+    app.cli.add_command(rebuild_project_totals)
+    app.cli.add_command(backfill_daily_totals_command)
+    app.cli.add_command(rebuild_catalogs_command)
+    app.cli.add_command(precompute_forecasts_command)
+    app.cli.add_command(import_expenses_command)
+    app.cli.add_command(archive_expenses_command)
+    app.cli.add_command(create_expense_partitions_command)
@@ -0,0 +1,85 @@
+"""
+Streaming CSV/JSON exports.
+Rows are pulled from the database in batches (Query.yield_per, which uses a
+server-side cursor on PostgreSQL) and encoded as they arrive, so an export
+runs in constant memory and the first bytes go out immediately.
+"""
+import csv
+import io
+import json
+import zlib
+from flask import Response, stream_with_context
+
+EXPORT_FORMATS = ('csv', 'json')
+EXPORT_BATCH_SIZE = 1000
+
+LEDGER_COLUMNS = ['id', 'date', 'expense_type', 'item_name', 'quantity', 'unit_price', 'gst_amount',
+                  'total_amount', 'invoice_number', 'project', 'seller_name', 'gstn']
+REPORT_COLUMNS = ['project_id', 'project', 'total_expenses', 'total_revenues', 'profit']
+
+
+def ledger_export_row(row):
+    """Flattens a queries.expense_ledger_query row into LEDGER_COLUMNS order."""
+    return [row.id, row.created_at.isoformat() if row.created_at else '', row.expense_type, row.item_name,
+            row.quantity, row.unit_price, row.gst_amount, row.total_amount, row.invoice_number,
+            row.project_name, row.seller_name, row.seller_gstn]
+
+
+def report_export_row(row):
+    """Flattens a queries.project_report_query row into REPORT_COLUMNS order."""
+    # NOT NULL rollup columns: always Decimals, so JSON gets '0.00', never 0.
+    expenses, revenues = row.total_expenses, row.total_revenues
+    return [row.id, row.name, expenses, revenues, revenues - expenses]
+
+
+def _csv_chunks(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _json_chunks(columns, rows):
+    parts = ['[']
+    for count, row in enumerate(rows):
+        record = {column: str(value) if value is not None and not isinstance(value, (int, str)) else value
+                  for column, value in zip(columns, row)}
+        parts.append((',' if count else '') + json.dumps(record))
+        if len(parts) >= EXPORT_BATCH_SIZE:
+            yield ''.join(parts)
+            parts = []
+    parts.append(']')
+    yield ''.join(parts)
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(fmt, filename, columns, rows, compress=False):
+    """
+    Streams `rows` (an iterable of sequences in `columns` order) as a CSV or
+    JSON attachment, gzip-compressed when `compress` is set.
+    """
+    if fmt == 'csv':
+        chunks, mimetype = _csv_chunks(columns, rows), 'text/csv'
+    else:
+        chunks, mimetype = _json_chunks(columns, rows), 'application/json'
+    filename = f'{filename}.{fmt}'
+    if compress:
+        body, mimetype, filename = _gzip(chunks), 'application/gzip', filename + '.gz'
+    else:
+        body = (chunk.encode() for chunk in chunks)
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
@@ -0,0 +1,59 @@
+"""
+Forecast pages.
+Kept apart from routes.py because this is the only feature backed by the
+scientific stack. pandas, numpy and statsmodels are imported only inside
+forecasting.fit_forecasts, which runs in the forecast process pool (see
+jobs.py), so web workers and CLI commands never load them.
+"""
+from flask import Blueprint, render_template, redirect, url_for, flash, jsonify
+from flask_login import current_user, login_required
+from queries import forecast_series_queries
+from aggregates import current_data_version
+from forecasting import MODEL_LABELS
+from jobs import forecast_jobs, forecast_key, forecast_window
+
+forecast_routes = Blueprint('forecast', __name__)
+
+def forecast_payload(result):
+    """The JSON form of a fitted forecast, shared with the API."""
+    return {key: result[key] for key in ('forecast', 'model', 'mae', 'projects', 'expense_types')}
+
+def _forecast_status():
+    """
+    Returns (status, result) for the current user's forecast, scheduling a
+    background fit if none is cached or running. Status is one of 'ready',
+    'pending', 'failed' or 'insufficient'.
+    """
+    cache_key = forecast_key(current_user.id, current_data_version(current_user.id))
+    status = forecast_jobs.status(cache_key)
+    if status is not None:
+        return status
+    since, end_day = forecast_window()
+    series = {kind: query.all() for kind, query in forecast_series_queries(current_user.id, since).items()}
+    return forecast_jobs.schedule(cache_key, series, end_day), None
+
+@forecast_routes.route('/forecast')
+@login_required
+def forecast():
+    status, result = _forecast_status()
+    if status == 'insufficient':
+        flash("Not enough expense data for a reliable forecast.", "warning")
+        return redirect(url_for('routes.index'))
+    if status == 'failed':
+        flash(f"Could not generate forecast: {result['error']}", "danger")
+        return redirect(url_for('routes.index'))
+    if status == 'pending':
+        return render_template('forecast.html', forecast=None)
+    return render_template('forecast.html', forecast=result['forecast'], result=result, model_labels=MODEL_LABELS)
+
+@forecast_routes.route('/forecast/status')
+@login_required
+def forecast_status():
+    """Polled by the forecast page while the fit runs in the background."""
+    status, result = _forecast_status()
+    payload = {'status': status}
+    if status == 'ready':
+        payload.update(forecast_payload(result))
+    elif status == 'failed':
+        payload['error'] = result['error']
+    return jsonify(payload)
@@ -0,0 +1,199 @@
+"""
+Expense forecasting.
+fit_forecasts is a pure function of daily spending rows so it can run in a
+worker process (see jobs.py) without an app or database connection.
+
+One call forecasts a user's total spending and each of their projects and
+expense types. All series go into one (series x days) NumPy matrix, the
+cheap baselines (exponential smoothing, seasonal naive) are fitted to every
+row at once, ARIMA is tried on the total only, and a rolling-origin backtest
+picks the model with the lowest error for each series.
+
+numpy and statsmodels (which pulls in pandas and scipy) are imported inside
+the functions, not at module level: together they add seconds and well over
+100 MB to every process that imports them, and only the forecast pool
+processes need them. Keep this module importable without them.
+"""
+import time
+import warnings
+
+FORECAST_DAYS = 7
+MIN_EXPENSES = 10
+# Days of history fed to the models.
+HISTORY_DAYS = 365
+# Weekly seasonality for the seasonal naive model.
+SEASON = 7
+# Rolling-origin backtest: the last BACKTEST_FOLDS windows of FORECAST_DAYS.
+BACKTEST_FOLDS = 3
+SES_ALPHAS = (0.1, 0.2, 0.3, 0.5, 0.8)
+DEFAULT_SES_ALPHA = 0.3
+# Series kinds that also get an ARIMA candidate; it costs one fit per fold.
+ARIMA_KINDS = ('total',)
+# Candidate order doubles as the preference on ties and as the fallback.
+MODELS = ('exp_smoothing', 'seasonal_naive', 'arima')
+MODEL_LABELS = {'exp_smoothing': 'Exponential smoothing', 'seasonal_naive': 'Seasonal naive (weekly)',
+                'arima': 'ARIMA(1,1,1)'}
+
+
+def _daily_matrix(rows, end_day):
+    """
+    Pivots (kind, key, label, day, total) rows into a zero-filled matrix with
+    one row per (kind, key) and one column per day up to `end_day`.
+    Returns (series, labels, y, first_day).
+    """
+    import numpy as np
+
+    index, labels, cells = {}, [], []
+    for kind, key, label, day, total in rows:
+        if (kind, key) not in index:
+            index[(kind, key)] = len(labels)
+            labels.append(label)
+        # SQLite returns DATE() results as text; both forms start with YYYY-MM-DD.
+        cells.append((index[(kind, key)], str(day)[:10], float(total)))
+
+    series_rows = np.array([cell[0] for cell in cells], dtype=int)
+    days = np.array([cell[1] for cell in cells], dtype='datetime64[D]')
+    totals = np.array([cell[2] for cell in cells], dtype=float)
+    first_day = days.min()
+    last_day = max(days.max(), np.datetime64(str(end_day)[:10], 'D'))
+    y = np.zeros((len(labels), int((last_day - first_day).astype(int)) + 1))
+    np.add.at(y, (series_rows, (days - first_day).astype(int)), totals)
+    return list(index), labels, y, first_day
+
+
+def _exp_smoothing(y, origins, steps):
+    """
+    Simple exponential smoothing for every series and alpha at once. The
+    level after each day is kept, so a forecast from any backtest origin is
+    just the level on the day before it.
+    Returns (errors, forecasts) of shapes (series,) and (series, steps).
+    """
+    import numpy as np
+
+    n, length = y.shape
+    alphas = np.array(SES_ALPHAS)
+    levels = np.empty((n, len(alphas), length))
+    level = np.repeat(y[:, :1], len(alphas), axis=1)
+    for t in range(length):
+        level = alphas * y[:, t:t + 1] + (1 - alphas) * level
+        levels[:, :, t] = level
+
+    if origins:
+        errors = np.mean([np.abs(y[:, None, o:o + steps] - levels[:, :, o - 1:o]).mean(axis=2)
+                          for o in origins], axis=0)
+        best = errors.argmin(axis=1)
+        error = errors[np.arange(n), best]
+    else:
+        best = np.full(n, SES_ALPHAS.index(DEFAULT_SES_ALPHA))
+        error = np.full(n, np.nan)
+    forecast = np.repeat(levels[np.arange(n), best, length - 1][:, None], steps, axis=1)
+    return error, forecast
+
+
+def _seasonal_naive(y, origins, steps):
+    """Repeats the last SEASON days. Returns (errors, forecasts) like _exp_smoothing."""
+    import numpy as np
+
+    n, length = y.shape
+    if length < SEASON:
+        return np.full(n, np.nan), np.full((n, steps), np.nan)
+    offsets = np.arange(steps) % SEASON - SEASON
+    if origins:
+        error = np.mean([np.abs(y[:, o:o + steps] - y[:, o + offsets]).mean(axis=1) for o in origins], axis=0)
+    else:
+        error = np.full(n, np.nan)
+    return error, y[:, length + offsets]
+
+
+def _arima(y, candidates, origins, steps):
+    """
+    log1p-ARIMA(1,1,1) for the `candidates` rows only, one fit per backtest
+    fold plus the final fit. Rows that are not candidates, or whose fit
+    fails, get NaN. Returns (errors, forecasts) like _exp_smoothing.
+    """
+    import numpy as np
+    from statsmodels.tsa.arima.model import ARIMA
+
+    n, length = y.shape
+    error, forecast = np.full(n, np.nan), np.full((n, steps), np.nan)
+
+    def fit(values):
+        with warnings.catch_warnings():
+            # Short or flat series trigger convergence warnings; the backtest
+            # judges the result either way.
+            warnings.simplefilter('ignore')
+            result = ARIMA(np.log1p(values), order=(1, 1, 1)).fit()
+        return np.clip(np.expm1(result.forecast(steps)), 0, None)
+
+    for row in candidates:
+        if length < 2 * SEASON:
+            continue
+        try:
+            if origins:
+                error[row] = np.mean([np.abs(y[row, o:o + steps] - fit(y[row, :o])).mean() for o in origins])
+            forecast[row] = fit(y[row])
+        except Exception:
+            error[row], forecast[row] = np.nan, np.nan
+    return error, forecast
+
+
+def fit_forecasts(rows, end_day, steps=FORECAST_DAYS, folds=BACKTEST_FOLDS):
+    """
+    Forecasts `steps` days after `end_day` for every series in `rows`.
+
+    `rows` are (kind, key, label, day, total) tuples, one per series and day
+    with spending; kind is 'total', 'project' or 'expense_type'. Days without
+    a row count as zero. Each series gets the model with the lowest mean
+    absolute error over the last `folds` windows of `steps` days; series too
+    short to backtest use exponential smoothing.
+
+    Returns {'forecast': {'YYYY-MM-DD': amount, ...}, 'model', 'mae'} for the
+    total, plus 'projects' and 'expense_types' lists of
+    {'key', 'label', 'model', 'mae', 'forecast', 'next_total'} and
+    'fit_seconds'. Raises ValueError when `rows` is empty.
+    """
+    import numpy as np
+
+    if not rows:
+        raise ValueError("No expense history to forecast.")
+    started = time.perf_counter()
+    series, labels, y, first_day = _daily_matrix(rows, end_day)
+    n, length = y.shape
+    folds = min(folds, max((length - SEASON) // steps, 0))
+    origins = [length - k * steps for k in range(folds, 0, -1)]
+
+    arima_rows = [row for row, (kind, _) in enumerate(series) if kind in ARIMA_KINDS]
+    candidates = {
+        'exp_smoothing': _exp_smoothing(y, origins, steps),
+        'seasonal_naive': _seasonal_naive(y, origins, steps),
+        'arima': _arima(y, arima_rows, origins, steps),
+    }
+    errors = np.array([candidates[name][0] for name in MODELS])
+    forecasts = np.array([candidates[name][1] for name in MODELS])
+    # A model is only eligible where it produced a forecast; untested ones
+    # rank last, so exponential smoothing (first in MODELS) is the fallback.
+    usable = ~np.isnan(forecasts).any(axis=2)
+    ranked = np.where(usable & ~np.isnan(errors), errors, np.inf)
+    choice = ranked.argmin(axis=0)
+
+    forecast_dates = [str(first_day + length + day) for day in range(steps)]
+    results = []
+    for row, (kind, key) in enumerate(series):
+        values = np.clip(forecasts[choice[row], row], 0, None)
+        error = errors[choice[row], row]
+        results.append({
+            'kind': kind, 'key': key, 'label': labels[row], 'model': MODELS[choice[row]],
+            'mae': None if np.isnan(error) else round(float(error), 2),
+            'forecast': {date: round(float(value), 2) for date, value in zip(forecast_dates, values)},
+            'next_total': round(float(values.sum()), 2),
+        })
+
+    total = next((result for result in results if result['kind'] == 'total'), None)
+    if total is None:
+        raise ValueError("Forecast rows must include the 'total' series.")
+    return {
+        'forecast': total['forecast'], 'model': total['model'], 'mae': total['mae'],
+        'projects': [result for result in results if result['kind'] == 'project'],
+        'expense_types': [result for result in results if result['kind'] == 'expense_type'],
+        'fit_seconds': time.perf_counter() - started,
+    }
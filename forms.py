@@ -1,8 +1,15 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, IntegerField, FloatField, SelectField, SubmitField, PasswordField, BooleanField
-from wtforms.validators import DataRequired, EqualTo, ValidationError
+from flask_wtf.file import FileField, FileRequired, FileAllowed
+from wtforms import (Form, StringField, IntegerField, FloatField, DecimalField, SelectField, SubmitField, PasswordField,
+                     BooleanField, DateField, FieldList, FormField)
+from wtforms.validators import DataRequired, EqualTo, ValidationError, Optional
+from werkzeug.datastructures import MultiDict
 from models import User
 
+def normalize_gstn(value):
+    """GSTNs are stored upper-cased, so lookups and searches match however they were typed."""
+    return value.strip().upper() if value else value
+
 # New form for user registration
 class RegistrationForm(FlaskForm):
     username = StringField('Username', validators=[DataRequired()])
@@ -36,13 +43,90 @@ class ExpenseForm(FlaskForm):
     gst_amount = FloatField('GST Amount', validators=[DataRequired()])
     invoice_number = StringField('Invoice Number', validators=[DataRequired()])
     seller_name = StringField('Seller Name', validators=[DataRequired()])
-    gstn = StringField('GSTN', validators=[DataRequired()])
+    gstn = StringField('GSTN', validators=[DataRequired()], filters=[normalize_gstn])
     # FIX: Removed employee_id field
     project_id = SelectField('Project', coerce=int, validators=[DataRequired()])
     submit = SubmitField('Log Expense')
 
+# An invoice is inserted as one statement; this keeps it within bind-parameter limits.
+MAX_INVOICE_LINES = 200
+
+class InvoiceLineForm(Form):
+    """One line item of an InvoiceForm; amounts are kept as Decimal."""
+    expense_type = StringField('Expense Type', validators=[DataRequired()])
+    item_name = StringField('Item Name', validators=[DataRequired()])
+    quantity = IntegerField('Quantity', validators=[DataRequired()])
+    unit_price = DecimalField('Unit Price', validators=[DataRequired()])
+    gst_amount = DecimalField('GST Amount', validators=[DataRequired()])
+
+class InvoiceForm(FlaskForm):
+    """An invoice's line items, sharing its number, seller and project."""
+    invoice_number = StringField('Invoice Number', validators=[DataRequired()])
+    seller_name = StringField('Seller Name', validators=[DataRequired()])
+    gstn = StringField('GSTN', validators=[DataRequired()], filters=[normalize_gstn])
+    project_id = SelectField('Project', coerce=int, validators=[DataRequired()])
+    # No max_entries: FieldList would silently drop the extra lines.
+    lines = FieldList(FormField(InvoiceLineForm), min_entries=1)
+    submit = SubmitField('Log Invoice')
+
+    def validate_lines(self, lines):
+        if len(lines.entries) > MAX_INVOICE_LINES:
+            raise ValidationError(f'An invoice can have at most {MAX_INVOICE_LINES} line items.')
+
+    @staticmethod
+    def formdata_from_json(payload):
+        """
+        Flattens a JSON invoice ({..., "lines": [{...}, ...]}) into the form's
+        field names (lines-0-item_name, ...). Returns None for a malformed body.
+        """
+        if not isinstance(payload, dict) or not isinstance(payload.get('lines'), list):
+            return None
+        data = MultiDict({key: str(value) for key, value in payload.items()
+                          if key != 'lines' and value is not None})
+        for index, line in enumerate(payload['lines']):
+            if not isinstance(line, dict):
+                return None
+            for key, value in line.items():
+                if value is not None:
+                    data[f'lines-{index}-{key}'] = str(value)
+        return data
+
 class RevenueForm(FlaskForm):
     project_id = SelectField('Project', coerce=int, validators=[DataRequired()])
     total_estimated_revenue = FloatField('Total Estimated Revenue', validators=[DataRequired()])
     # FIX: Removed employee_id field
     submit = SubmitField('Log Revenue')
+
+class LedgerFilterForm(FlaskForm):
+    """Filters for the expense ledger. Submitted via GET, so CSRF is not used."""
+    class Meta:
+        csrf = False
+
+    # The form shares the Expenses page with ExpenseForm, so its DOM ids get
+    # a prefix; the field names (query-string keys) stay unprefixed.
+    project_id = SelectField('Project', coerce=int, validators=[Optional()], id='filter-project_id')
+    gstn = StringField('Seller GSTN', validators=[Optional()], filters=[normalize_gstn], id='filter-gstn')
+    expense_type = StringField('Expense Type', validators=[Optional()], id='filter-expense_type')
+    date_from = DateField('From', validators=[Optional()], id='filter-date_from')
+    date_to = DateField('To', validators=[Optional()], id='filter-date_to')
+    include_archived = BooleanField('Include archived years', id='filter-include_archived')
+    submit = SubmitField('Filter', id='filter-submit')
+
+    def validate_date_to(self, date_to):
+        if self.date_from.data and date_to.data and date_to.data < self.date_from.data:
+            raise ValidationError("'To' date must not be before 'From' date.")
+
+    def filters(self):
+        """The validated filters as keyword arguments for queries.expense_ledger_query."""
+        return {
+            'project_id': self.project_id.data or None,
+            'gstn': (self.gstn.data or '').strip() or None,
+            'expense_type': (self.expense_type.data or '').strip() or None,
+            'date_from': self.date_from.data,
+            'date_to': self.date_to.data,
+            'include_archived': self.include_archived.data,
+        }
+
+class ExpenseImportForm(FlaskForm):
+    file = FileField('CSV or Excel file', validators=[FileRequired(), FileAllowed(['csv', 'xlsx'], 'Upload a .csv or .xlsx file.')])
+    submit = SubmitField('Import Expenses')
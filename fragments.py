@@ -0,0 +1,44 @@
+"""
+Rendered-fragment caching for read-heavy pages.
+
+The title and content blocks of a page template are rendered once per user
+and data version and kept in fragment_cache; later requests wrap the stored
+HTML in the base layout (navigation, flash messages) without running the
+page's queries. Writes bump the user's data version (see
+aggregates.bump_data_version), so a changed page gets a new key and the old
+fragment simply ages out.
+"""
+from flask import current_app, render_template
+from markupsafe import Markup
+from cache import fragment_cache
+from aggregates import current_data_version
+
+
+def fragment_key(template_name, user_id, *parts):
+    """Cache key of a page fragment for the user's current data version."""
+    version = current_data_version(user_id)
+    return ':'.join(['fragment', template_name, str(user_id), str(version), *map(str, parts)])
+
+
+def _render_blocks(template_name, context):
+    """Renders the title and content blocks of `template_name` without its layout."""
+    template = current_app.jinja_env.get_template(template_name)
+    current_app.update_template_context(context)
+    blocks = {}
+    for name in ('title', 'content'):
+        block = template.blocks.get(name)
+        blocks[name] = ''.join(block(template.new_context(context))) if block else ''
+    return blocks
+
+
+def render_cached_page(template_name, key, build_context):
+    """
+    Renders `template_name` with its title and content blocks served from
+    fragment_cache under `key`. `build_context` returns the template context
+    and is only called on a miss; it may abort (e.g. 404), which is not cached.
+    """
+    blocks = fragment_cache.get(key)
+    if blocks is None:
+        blocks = _render_blocks(template_name, build_context())
+        fragment_cache.set(key, blocks)
+    return render_template('fragment_page.html', title=Markup(blocks['title']), content=Markup(blocks['content']))
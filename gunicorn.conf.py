@@ -0,0 +1,39 @@
+"""
+Gunicorn settings, picked up automatically when gunicorn is started from
+the project folder:
+
+    gunicorn wsgi:app
+
+Workers are processes and threads serve requests inside each one. Every
+worker owns a SQLAlchemy pool of DB_POOL_SIZE + DB_MAX_OVERFLOW connections,
+so threads are capped at that number (more threads would only queue on the
+pool) and the database must accept workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+connections in total.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+workers = int(os.environ.get('WEB_CONCURRENCY') or min(multiprocessing.cpu_count() * 2 + 1, 8))
+worker_class = 'gthread'
+_pool_connections = int(os.environ.get('DB_POOL_SIZE') or 5) + int(os.environ.get('DB_MAX_OVERFLOW') or 5)
+threads = min(int(os.environ.get('GUNICORN_THREADS') or 4), _pool_connections)
+
+# Keep above DB_STATEMENT_TIMEOUT_MS so a slow query fails with an error
+# instead of the worker being killed mid-request.
+timeout = int(os.environ.get('GUNICORN_TIMEOUT') or 60)
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then to bound slow memory growth (fragmentation,
+# per-worker caches). pandas/statsmodels load only in the forecast pool's
+# processes, which are recycled with their worker.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS') or 1000)
+max_requests_jitter = max_requests // 10
+
+# Each worker imports the app itself, so no database connections or
+# forecast process pools are shared across a fork.
+preload_app = False
+
+accesslog = '-'
@@ -0,0 +1,181 @@
+"""
+Bulk expense import from CSV or Excel (.xlsx) files.
+
+Files are parsed as a stream and processed in chunks: each chunk is
+validated with ExpenseForm's rules, resolves all of its sellers with one
+GSTN lookup, inserts its expenses with a single executemany and commits on
+its own, so one bad chunk does not undo the rest of the file.
+
+Expected columns (header row, any order): expense_type, item_name, quantity,
+unit_price, gst_amount, invoice_number, seller_name, gstn, and either
+project (name) or project_id. An optional date column (YYYY-MM-DD) sets the
+expense date; it defaults to the time of import.
+"""
+import csv
+import io
+from datetime import datetime
+from itertools import islice
+from sqlalchemy.dialects import postgresql, sqlite
+from werkzeug.datastructures import MultiDict
+from models import db, Seller, Project, Expense
+from forms import ExpenseForm
+from aggregates import record_expenses, money
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+class ImportReport:
+    def __init__(self):
+        self.inserted = 0
+        self.errors = []  # (row_number, message)
+
+    def add_error(self, row_number, message):
+        self.errors.append((row_number, message))
+
+
+def _iter_csv(stream):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    for row_number, row in enumerate(csv.DictReader(text), start=2):
+        yield row_number, {key.strip().lower(): (value or '').strip()
+                           for key, value in row.items() if key is not None}
+
+
+def _cell_text(value):
+    # Excel stores every number as a float; render whole numbers as integers
+    # so IntegerField accepts them.
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def _iter_xlsx(stream):
+    try:
+        from openpyxl import load_workbook
+    except ImportError as e:
+        raise ValueError("Excel import requires the 'openpyxl' package.") from e
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(cell or '').strip().lower() for cell in next(rows, ())]
+        for row_number, values in enumerate(rows, start=2):
+            if all(value is None for value in values):
+                continue
+            yield row_number, {key: _cell_text(value) for key, value in zip(header, values) if key}
+    finally:
+        workbook.close()
+
+
+def iter_rows(stream, filename):
+    """Yields (row_number, {column: text}) from a CSV or XLSX file object."""
+    if filename.lower().endswith('.xlsx'):
+        return _iter_xlsx(stream)
+    if filename.lower().endswith('.csv'):
+        return _iter_csv(stream)
+    raise ValueError("Only .csv and .xlsx files can be imported.")
+
+
+def _validate(row, projects_by_name, project_choices):
+    """Returns (values, None) for a valid row or (None, error message)."""
+    data = dict(row)
+    if not data.get('project_id') and data.get('project'):
+        project_id = projects_by_name.get(data['project'].lower())
+        if project_id is None:
+            return None, f"Unknown project {data['project']!r}."
+        data['project_id'] = str(project_id)
+
+    form = ExpenseForm(formdata=MultiDict(data), meta={'csrf': False})
+    form.project_id.choices = project_choices
+    if not form.validate():
+        return None, '; '.join(f"{name}: {', '.join(errors)}" for name, errors in form.errors.items())
+
+    created_at = datetime.utcnow()
+    if data.get('date'):
+        try:
+            created_at = datetime.fromisoformat(data['date'])
+        except ValueError:
+            return None, f"date: {data['date']!r} is not a YYYY-MM-DD date."
+
+    unit_price = money(form.unit_price.data)
+    gst_amount = money(form.gst_amount.data)
+    return {
+        'expense_type': form.expense_type.data,
+        'item_name': form.item_name.data.strip(),
+        'quantity': form.quantity.data,
+        'unit_price': unit_price,
+        'gst_amount': gst_amount,
+        'total_amount': unit_price * form.quantity.data + gst_amount,
+        'invoice_number': form.invoice_number.data.strip(),
+        'seller_name': form.seller_name.data.strip(),
+        'gstn': form.gstn.data.strip(),
+        'project_id': form.project_id.data,
+        'created_at': created_at,
+    }, None
+
+
+def resolve_sellers(sellers):
+    """
+    Maps {gstn: name} to {gstn: seller_id} with one lookup, inserting the
+    GSTNs that do not exist yet. Existing sellers keep their current name.
+    """
+    if not sellers:
+        return {}
+    existing = dict(db.session.query(Seller.gstn, Seller.id).filter(Seller.gstn.in_(list(sellers))))
+    missing = [{'gstn': gstn, 'name': name} for gstn, name in sellers.items() if gstn not in existing]
+    if missing:
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+            # Another request may add the same GSTN concurrently; keep theirs.
+            db.session.execute(insert(Seller).on_conflict_do_nothing(index_elements=['gstn']), missing)
+        else:
+            db.session.execute(db.insert(Seller), missing)
+        existing.update(db.session.query(Seller.gstn, Seller.id)
+                        .filter(Seller.gstn.in_([seller['gstn'] for seller in missing])))
+    return existing
+
+
+def _import_chunk(user_id, chunk, projects_by_name, project_choices, report):
+    rows, sellers = [], {}
+    for row_number, row in chunk:
+        values, error = _validate(row, projects_by_name, project_choices)
+        if error:
+            report.add_error(row_number, error)
+            continue
+        sellers.setdefault(values['gstn'], values['seller_name'])
+        rows.append((row_number, values))
+    if not rows:
+        return
+
+    try:
+        seller_ids = resolve_sellers(sellers)
+        expenses = []
+        for _, values in rows:
+            expense = {key: value for key, value in values.items() if key not in ('gstn', 'seller_name')}
+            expense.update(user_id=user_id, seller_id=seller_ids[values['gstn']], updated_flag=False)
+            expenses.append(expense)
+        db.session.execute(db.insert(Expense), expenses)
+        record_expenses(expenses)
+        db.session.commit()
+        report.inserted += len(expenses)
+    except Exception as e:
+        db.session.rollback()
+        for row_number, _ in rows:
+            report.add_error(row_number, f"Not imported, chunk failed: {e}")
+
+
+def import_expenses(user_id, rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Imports (row_number, row) pairs for a user. Returns an ImportReport."""
+    projects = db.session.query(Project.id, Project.name).filter_by(user_id=user_id).all()
+    projects_by_name = {name.lower(): project_id for project_id, name in projects}
+    project_choices = [(project_id, name) for project_id, name in projects]
+
+    report = ImportReport()
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        _import_chunk(user_id, chunk, projects_by_name, project_choices, report)
+    return report
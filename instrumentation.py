@@ -0,0 +1,163 @@
+"""
+Opt-in per-request performance instrumentation.
+
+When PERF_INSTRUMENTATION is enabled this records, per endpoint, the number
+of SQL statements, time spent in the database, time spent rendering
+templates and total request time. Each response gets a Server-Timing header
+(visible in the browser's network panel), statements slower than
+SLOW_QUERY_MS are logged with their parameters, and /metrics serves the
+counters in Prometheus text format. Counters are per process; scrape every
+gunicorn worker or sum them downstream.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from flask import g, request, has_request_context, Response, abort, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from cache import Cache
+
+slow_query_log = logging.getLogger('expensepro.slow_sql')
+
+# (name, help text) of the per-endpoint counters, in /metrics order.
+ENDPOINT_METRICS = [
+    ('requests_total', 'Requests handled.'),
+    ('request_seconds_total', 'Wall-clock time spent handling requests.'),
+    ('db_queries_total', 'SQL statements executed.'),
+    ('db_seconds_total', 'Time spent waiting on SQL statements.'),
+    ('render_seconds_total', 'Time spent rendering templates.'),
+    ('slow_queries_total', 'SQL statements slower than SLOW_QUERY_MS.'),
+]
+
+
+class PerfMonitor:
+    def __init__(self):
+        self.enabled = False
+        self.slow_query_seconds = 0.2
+        self.metrics_token = None
+        self._lock = threading.Lock()
+        self._endpoints = defaultdict(lambda: defaultdict(float))
+        self._max_queries = defaultdict(int)
+        self._fits = [0, 0.0]  # count, seconds
+
+    def init_app(self, app):
+        self.enabled = app.config.get('PERF_INSTRUMENTATION', False)
+        if not self.enabled:
+            return
+        self.slow_query_seconds = app.config.get('SLOW_QUERY_MS', 200) / 1000
+        self.metrics_token = app.config.get('METRICS_TOKEN')
+
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+    # --- Request lifecycle ---
+
+    def _start_request(self):
+        g.perf = {'start': time.perf_counter(), 'queries': 0, 'db': 0.0, 'render': 0.0, 'slow': 0}
+
+    def _finish_request(self, response):
+        stats = g.get('perf')
+        if stats is None:
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        if response.is_streamed:
+            # A streamed body (the exports) runs its queries while it is sent,
+            # after this hook; count them once the response is closed. The
+            # Server-Timing header can only cover the work before the body.
+            response.call_on_close(lambda: self._record(endpoint, stats))
+            description = f'{stats["queries"]} queries before the streamed body'
+        else:
+            g.pop('perf', None)
+            self._record(endpoint, stats)
+            description = f'{stats["queries"]} queries'
+        response.headers.add('Server-Timing', ', '.join([
+            f'db;dur={stats["db"] * 1000:.1f};desc="{description}"',
+            f'render;dur={stats["render"] * 1000:.1f}',
+            f'total;dur={(time.perf_counter() - stats["start"]) * 1000:.1f}',
+        ]))
+        return response
+
+    def _record(self, endpoint, stats):
+        elapsed = time.perf_counter() - stats['start']
+        with self._lock:
+            counters = self._endpoints[endpoint]
+            counters['requests_total'] += 1
+            counters['request_seconds_total'] += elapsed
+            counters['db_queries_total'] += stats['queries']
+            counters['db_seconds_total'] += stats['db']
+            counters['render_seconds_total'] += stats['render']
+            counters['slow_queries_total'] += stats['slow']
+            self._max_queries[endpoint] = max(self._max_queries[endpoint], stats['queries'])
+
+    # --- SQLAlchemy hooks ---
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('perf_query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['perf_query_start'].pop()
+        slow = elapsed >= self.slow_query_seconds
+        if slow:
+            slow_query_log.warning("Slow query (%.1f ms) on %s: %s | params=%r", elapsed * 1000,
+                                   request.endpoint if has_request_context() else 'cli', statement, parameters)
+        if has_request_context() and 'perf' in g:
+            g.perf['queries'] += 1
+            g.perf['db'] += elapsed
+            g.perf['slow'] += slow
+
+    # --- Template hooks ---
+
+    def _before_render(self, sender, template, context, **extra):
+        if has_request_context() and 'perf' in g:
+            g.perf.setdefault('render_started', []).append(time.perf_counter())
+
+    def _after_render(self, sender, template, context, **extra):
+        if has_request_context() and g.get('perf', {}).get('render_started'):
+            g.perf['render'] += time.perf_counter() - g.perf['render_started'].pop()
+
+    # --- Background work ---
+
+    def record_forecast_fit(self, seconds):
+        """Records the duration of one forecast fit (run outside any request)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._fits[0] += 1
+            self._fits[1] += seconds
+
+    # --- Exposition ---
+
+    def metrics_view(self):
+        if self.metrics_token and request.headers.get('Authorization') != f'Bearer {self.metrics_token}':
+            abort(401)
+        lines = []
+        with self._lock:
+            for name, help_text in ENDPOINT_METRICS:
+                lines.append(f'# HELP expensepro_{name} {help_text}')
+                lines.append(f'# TYPE expensepro_{name} counter')
+                for endpoint, counters in sorted(self._endpoints.items()):
+                    lines.append(f'expensepro_{name}{{endpoint="{endpoint}"}} {counters[name]:g}')
+            lines.append('# HELP expensepro_db_queries_max Most SQL statements seen in a single request.')
+            lines.append('# TYPE expensepro_db_queries_max gauge')
+            for endpoint, value in sorted(self._max_queries.items()):
+                lines.append(f'expensepro_db_queries_max{{endpoint="{endpoint}"}} {value}')
+            lines.append('# HELP expensepro_forecast_fit_seconds Time spent fitting forecast models.')
+            lines.append('# TYPE expensepro_forecast_fit_seconds summary')
+            lines.append(f'expensepro_forecast_fit_seconds_count {self._fits[0]}')
+            lines.append(f'expensepro_forecast_fit_seconds_sum {self._fits[1]:g}')
+        for name, help_text in (('hits', 'Cache lookups that found an entry.'),
+                                ('misses', 'Cache lookups that found nothing.')):
+            lines.append(f'# HELP expensepro_cache_{name}_total {help_text}')
+            lines.append(f'# TYPE expensepro_cache_{name}_total counter')
+            for cache in Cache.instances:
+                lines.append(f'expensepro_cache_{name}_total{{cache="{cache.name}"}} {getattr(cache, name)}')
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+perf_monitor = PerfMonitor()
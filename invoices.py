@@ -0,0 +1,42 @@
+"""
+Multi-line invoice entry.
+
+The line items of one invoice share its number, seller and project, so they
+are logged together: the seller is resolved once, each line's total is
+computed here with Decimal from amounts rounded to the stored two places,
+and all lines are inserted with one multi-row INSERT before a single commit.
+"""
+from datetime import datetime
+from models import db, Expense
+from importer import resolve_sellers
+from aggregates import record_expenses, money
+
+def log_invoice(user_id, project_id, invoice_number, seller_name, gstn, lines):
+    """
+    Inserts the validated `lines` (mappings with expense_type, item_name,
+    quantity, unit_price and gst_amount) as expenses of one invoice and folds
+    them into the rollups. Returns the inserted rows; the caller commits.
+    """
+    gstn = gstn.strip()
+    seller_id = resolve_sellers({gstn: seller_name.strip()})[gstn]
+    created_at = datetime.utcnow()
+    rows = []
+    for line in lines:
+        unit_price, gst_amount = money(line['unit_price']), money(line['gst_amount'])
+        rows.append({
+            'expense_type': line['expense_type'],
+            'item_name': line['item_name'].strip(),
+            'quantity': line['quantity'],
+            'unit_price': unit_price,
+            'gst_amount': gst_amount,
+            'total_amount': unit_price * line['quantity'] + gst_amount,
+            'invoice_number': invoice_number.strip(),
+            'seller_id': seller_id,
+            'user_id': user_id,
+            'project_id': project_id,
+            'updated_flag': False,
+            'created_at': created_at,
+        })
+    db.session.execute(db.insert(Expense).values(rows))
+    record_expenses(rows)
+    return rows
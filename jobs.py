@@ -0,0 +1,144 @@
+"""
+Local job runner for forecast fits.
+Fits run in a process pool so they never hold a web worker; results land
+in forecast_cache, where any worker can pick them up. No broker is needed.
+A running fit is marked in forecast_cache too, so with the shared 'sqlite'
+backend (the default) a poll on another worker reports it as pending
+instead of starting a second fit.
+"""
+import multiprocessing
+import os
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from cache import forecast_cache
+from forecasting import fit_forecasts, MIN_EXPENSES, HISTORY_DAYS
+from instrumentation import perf_monitor
+
+# Failed fits are cached briefly so pollers see the error, then retried.
+ERROR_TTL = 60
+# A fit lost with its worker stops counting as pending after this long.
+PENDING_TTL = 300
+
+
+def forecast_key(user_id, data_version):
+    """
+    Cache key of a user's forecast. It includes the data version, so writes
+    make older forecasts unreachable instead of serving them stale.
+    """
+    # 'v2': results from the multi-series engine; older entries are ignored.
+    return f'forecast:v2:{user_id}:{data_version}'
+
+
+def forecast_window():
+    """(first day of history, last day) for a forecast fitted now."""
+    today = datetime.utcnow().date()
+    return today - timedelta(days=HISTORY_DAYS), today
+
+
+def forecast_rows(series):
+    """
+    Flattens {kind: (key, label, day, total, count) rows}, as returned by
+    queries.forecast_series_queries, into fit_forecasts input.
+    """
+    return [(kind, row.key, row.label, row.day, float(row.total))
+            for kind, rows in series.items() for row in rows]
+
+
+def _pool(max_workers):
+    # 'spawn' children start clean instead of inheriting the web worker's
+    # threads, sockets and database connections.
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+class ForecastJobs:
+    def __init__(self):
+        self.max_workers = 2
+        self._executor = None
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_workers = app.config.get('FORECAST_WORKERS', 2)
+
+    def _get_executor(self):
+        # Created on first use so every gunicorn worker owns its pool.
+        if self._executor is None:
+            self._executor = _pool(self.max_workers)
+        return self._executor
+
+    def is_pending(self, cache_key):
+        with self._lock:
+            return cache_key in self._pending
+
+    def status(self, cache_key):
+        """
+        Returns (status, result) when the forecast is cached ('ready' or
+        'failed') or being fitted ('pending'), else None.
+        """
+        cached = forecast_cache.get(cache_key)
+        if cached is not None:
+            if 'pending' in cached:
+                return 'pending', None
+            return ('failed' if 'error' in cached else 'ready'), cached
+        if self.is_pending(cache_key):
+            return 'pending', None
+        return None
+
+    def schedule(self, cache_key, series, end_day):
+        """
+        Starts a fit from the rows of queries.forecast_series_queries.
+        Returns 'pending', or 'insufficient' when there are too few expenses.
+        """
+        if sum(row.count for row in series['total']) < MIN_EXPENSES:
+            return 'insufficient'
+        self.submit(cache_key, forecast_rows(series), end_day)
+        return 'pending'
+
+    def submit(self, cache_key, rows, end_day):
+        """Schedules a fit unless one for this key is already running here."""
+        with self._lock:
+            if cache_key in self._pending:
+                return
+            try:
+                future = self._get_executor().submit(fit_forecasts, rows, end_day)
+            except BrokenProcessPool:
+                self._executor = _pool(self.max_workers)
+                future = self._executor.submit(fit_forecasts, rows, end_day)
+            self._pending[cache_key] = future
+            # Lets the other workers see the fit until _finish replaces it.
+            forecast_cache.set(cache_key, {'pending': True}, ttl=PENDING_TTL)
+        future.add_done_callback(lambda done: self._finish(cache_key, done))
+
+    def _finish(self, cache_key, future):
+        try:
+            result = future.result()
+            perf_monitor.record_forecast_fit(result['fit_seconds'])
+            forecast_cache.set(cache_key, result)
+        except Exception as e:
+            forecast_cache.set(cache_key, {'error': str(e)}, ttl=ERROR_TTL)
+        finally:
+            with self._lock:
+                self._pending.pop(cache_key, None)
+
+
+def precompute_forecasts(jobs, end_day, max_workers=None):
+    """
+    Batch mode: fits many forecasts in parallel across all cores.
+    `jobs` is an iterable of (cache_key, rows) with fit_forecasts rows. Returns
+    the number of (succeeded, failed) fits; results are written to forecast_cache.
+    """
+    succeeded = failed = 0
+    with _pool(max_workers or os.cpu_count()) as executor:
+        futures = {executor.submit(fit_forecasts, rows, end_day): cache_key for cache_key, rows in jobs}
+        for future in as_completed(futures):
+            try:
+                forecast_cache.set(futures[future], future.result())
+                succeeded += 1
+            except Exception:
+                failed += 1
+    return succeeded, failed
+
+
+forecast_jobs = ForecastJobs()
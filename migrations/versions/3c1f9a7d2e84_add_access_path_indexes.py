@@ -0,0 +1,44 @@
+"""Add composite indexes for per-user access paths
+
+Revision ID: 3c1f9a7d2e84
+Revises: b979242e7aef
+Create Date: 2026-10-18 10:12:41.218304
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1f9a7d2e84'
+down_revision = 'b979242e7aef'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('expense', schema=None) as batch_op:
+        batch_op.create_index('ix_expense_user_id_created_at', ['user_id', 'created_at'], unique=False)
+        batch_op.create_index('ix_expense_project_id_user_id', ['project_id', 'user_id'], unique=False)
+        batch_op.create_index('ix_expense_user_id_item_name', ['user_id', 'item_name'], unique=False)
+
+    with op.batch_alter_table('revenue', schema=None) as batch_op:
+        batch_op.create_index('ix_revenue_user_id_created_at', ['user_id', 'created_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_revenue_project_id'), ['project_id'], unique=False)
+
+    with op.batch_alter_table('project', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_project_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('project', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_project_user_id'))
+
+    with op.batch_alter_table('revenue', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_revenue_project_id'))
+        batch_op.drop_index('ix_revenue_user_id_created_at')
+
+    with op.batch_alter_table('expense', schema=None) as batch_op:
+        batch_op.drop_index('ix_expense_user_id_item_name')
+        batch_op.drop_index('ix_expense_project_id_user_id')
+        batch_op.drop_index('ix_expense_user_id_created_at')
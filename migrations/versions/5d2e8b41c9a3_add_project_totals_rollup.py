@@ -0,0 +1,53 @@
+"""Add project_totals rollup table
+
+Revision ID: 5d2e8b41c9a3
+Revises: 3c1f9a7d2e84
+Create Date: 2026-10-18 11:04:52.907114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2e8b41c9a3'
+down_revision = '3c1f9a7d2e84'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('project_totals',
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('total_expenses', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('total_revenues', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('expense_count', sa.Integer(), nullable=False),
+    sa.Column('revenue_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['project_id'], ['project.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('project_id')
+    )
+    with op.batch_alter_table('project_totals', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_project_totals_user_id'), ['user_id'], unique=False)
+
+    # Backfill from independent per-project aggregates (no expense x revenue fan-out).
+    op.execute("""
+        INSERT INTO project_totals
+            (project_id, user_id, total_expenses, total_revenues, expense_count, revenue_count)
+        SELECT p.id, p.user_id,
+               COALESCE(e.total, 0), COALESCE(r.total, 0),
+               COALESCE(e.n, 0), COALESCE(r.n, 0)
+        FROM project p
+        LEFT JOIN (SELECT project_id, SUM(total_amount) AS total, COUNT(*) AS n
+                   FROM expense GROUP BY project_id) e ON e.project_id = p.id
+        LEFT JOIN (SELECT project_id, SUM(total_estimated_revenue) AS total, COUNT(*) AS n
+                   FROM revenue GROUP BY project_id) r ON r.project_id = p.id
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('project_totals', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_project_totals_user_id'))
+
+    op.drop_table('project_totals')
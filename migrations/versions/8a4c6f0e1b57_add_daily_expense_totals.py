@@ -0,0 +1,39 @@
+"""Add daily_expense_totals rollup table
+
+Revision ID: 8a4c6f0e1b57
+Revises: 5d2e8b41c9a3
+Create Date: 2026-10-18 11:47:19.365027
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4c6f0e1b57'
+down_revision = '5d2e8b41c9a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('daily_expense_totals',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('total', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'day')
+    )
+
+    op.execute("""
+        INSERT INTO daily_expense_totals (user_id, day, total, count)
+        SELECT user_id, DATE(created_at), SUM(total_amount), COUNT(*)
+        FROM expense
+        WHERE created_at IS NOT NULL
+        GROUP BY user_id, DATE(created_at)
+    """)
+
+
+def downgrade():
+    op.drop_table('daily_expense_totals')
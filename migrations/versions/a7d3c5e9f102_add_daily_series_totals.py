@@ -0,0 +1,44 @@
+"""Add daily_series_totals rollup table for the per-project and per-type forecasts
+
+Revision ID: a7d3c5e9f102
+Revises: f3a9d6e1c274
+Create Date: 2026-10-18 18:12:36.540118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d3c5e9f102'
+down_revision = 'f3a9d6e1c274'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('daily_series_totals',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('expense_type', sa.String(length=50), nullable=False),
+    sa.Column('total', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['project_id'], ['project.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'day', 'project_id', 'expense_type')
+    )
+
+    op.execute("""
+        INSERT INTO daily_series_totals (user_id, day, project_id, expense_type, total, count)
+        SELECT user_id, DATE(created_at), project_id, expense_type, SUM(total_amount), COUNT(*)
+        FROM (SELECT user_id, project_id, expense_type, total_amount, created_at FROM expense
+              UNION ALL
+              SELECT user_id, project_id, expense_type, total_amount, created_at FROM expense_archive) AS history
+        WHERE created_at IS NOT NULL
+        GROUP BY user_id, DATE(created_at), project_id, expense_type
+    """)
+
+
+def downgrade():
+    op.drop_table('daily_series_totals')
@@ -0,0 +1,26 @@
+"""Add user data_version counter for cache invalidation
+
+Revision ID: c7e05d93a1f6
+Revises: 8a4c6f0e1b57
+Create Date: 2026-10-18 12:31:08.774512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7e05d93a1f6'
+down_revision = '8a4c6f0e1b57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('data_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('data_version')
@@ -0,0 +1,46 @@
+"""Upper-case seller GSTNs and recompute catalog search keys in Python
+
+Revision ID: d58e2b7a4c16
+Revises: a7d3c5e9f102
+Create Date: 2026-10-18 18:47:05.219864
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd58e2b7a4c16'
+down_revision = 'a7d3c5e9f102'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # GSTNs are now stored upper-cased. A lower-case GSTN whose
+    # upper-case form already exists (or belongs to a lower seller id) keeps
+    # its spelling, as seller.gstn is unique.
+    op.execute("""
+        UPDATE seller SET gstn = UPPER(gstn)
+        WHERE gstn <> UPPER(gstn)
+          AND NOT EXISTS (SELECT 1 FROM seller AS other WHERE other.gstn = UPPER(seller.gstn))
+          AND id = (SELECT MIN(other.id) FROM seller AS other WHERE UPPER(other.gstn) = UPPER(seller.gstn))
+    """)
+    op.execute("""
+        UPDATE seller_catalog SET gstn = (SELECT gstn FROM seller WHERE seller.id = seller_catalog.seller_id)
+    """)
+
+    # The catalogs were filled with SQL LOWER(), which folds only ASCII on
+    # SQLite; the application computes the keys with Python's str.lower().
+    bind = op.get_bind()
+    for table, key in (('item_catalog', ('user_id', 'name')), ('seller_catalog', ('user_id', 'seller_id'))):
+        rows = bind.execute(sa.text(f"SELECT {', '.join(key)}, name, name_key FROM {table}")).fetchall()
+        changed = [dict(zip(key, row[:2]), name_key=row[2].lower()) for row in rows if row[2].lower() != row[3]]
+        if changed:
+            bind.execute(sa.text(f"UPDATE {table} SET name_key = :name_key "
+                                 f"WHERE {key[0]} = :{key[0]} AND {key[1]} = :{key[1]}"), changed)
+
+
+def downgrade():
+    # The original spellings are not kept; upper-cased GSTNs and keys stay.
+    pass
@@ -0,0 +1,76 @@
+"""Add per-user item and seller catalogs for type-ahead search
+
+Revision ID: e41b7c2a9d05
+Revises: c7e05d93a1f6
+Create Date: 2026-10-18 16:05:42.913207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e41b7c2a9d05'
+down_revision = 'c7e05d93a1f6'
+branch_labels = None
+depends_on = None
+
+
+def _search_key(length):
+    return sa.String(length=length).with_variant(sa.String(length=length, collation='C'), 'postgresql')
+
+
+def upgrade():
+    op.create_table('item_catalog',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('name_key', _search_key(100), nullable=False),
+    sa.Column('use_count', sa.Integer(), nullable=False),
+    sa.Column('last_used_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'name')
+    )
+    with op.batch_alter_table('item_catalog', schema=None) as batch_op:
+        batch_op.create_index('ix_item_catalog_user_id_name_key', ['user_id', 'name_key'], unique=False)
+
+    op.create_table('seller_catalog',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('seller_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('name_key', _search_key(100), nullable=False),
+    sa.Column('gstn', _search_key(15), nullable=False),
+    sa.Column('use_count', sa.Integer(), nullable=False),
+    sa.Column('last_used_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['seller_id'], ['seller.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'seller_id')
+    )
+    with op.batch_alter_table('seller_catalog', schema=None) as batch_op:
+        batch_op.create_index('ix_seller_catalog_user_id_gstn', ['user_id', 'gstn'], unique=False)
+        batch_op.create_index('ix_seller_catalog_user_id_name_key', ['user_id', 'name_key'], unique=False)
+
+    op.execute("""
+        INSERT INTO item_catalog (user_id, name, name_key, use_count, last_used_at)
+        SELECT user_id, item_name, LOWER(item_name), COUNT(*), MAX(created_at)
+        FROM expense
+        GROUP BY user_id, item_name
+    """)
+    op.execute("""
+        INSERT INTO seller_catalog (user_id, seller_id, name, name_key, gstn, use_count, last_used_at)
+        SELECT expense.user_id, seller.id, seller.name, LOWER(seller.name), seller.gstn,
+               COUNT(*), MAX(expense.created_at)
+        FROM expense JOIN seller ON seller.id = expense.seller_id
+        GROUP BY expense.user_id, seller.id, seller.name, seller.gstn
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('seller_catalog', schema=None) as batch_op:
+        batch_op.drop_index('ix_seller_catalog_user_id_name_key')
+        batch_op.drop_index('ix_seller_catalog_user_id_gstn')
+
+    op.drop_table('seller_catalog')
+    with op.batch_alter_table('item_catalog', schema=None) as batch_op:
+        batch_op.drop_index('ix_item_catalog_user_id_name_key')
+
+    op.drop_table('item_catalog')
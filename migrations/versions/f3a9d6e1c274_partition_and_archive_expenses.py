@@ -0,0 +1,141 @@
+"""Partition expense by month on PostgreSQL and add expense_archive
+
+Revision ID: f3a9d6e1c274
+Revises: e41b7c2a9d05
+Create Date: 2026-10-18 17:12:36.408115
+
+"""
+from datetime import date, datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a9d6e1c274'
+down_revision = 'e41b7c2a9d05'
+branch_labels = None
+depends_on = None
+
+# Monthly partitions created ahead of today; `flask create-expense-partitions` adds more.
+MONTHS_AHEAD = 3
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _partition_postgresql():
+    """Rebuilds expense as a table range-partitioned by month on created_at."""
+    op.execute("ALTER TABLE expense RENAME TO expense_unpartitioned")
+    op.execute("ALTER TABLE expense_unpartitioned RENAME CONSTRAINT expense_pkey TO expense_unpartitioned_pkey")
+    # The id sequence must outlive the old table.
+    op.execute("ALTER SEQUENCE expense_id_seq OWNED BY NONE")
+    op.execute("CREATE TABLE expense (LIKE expense_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)")
+    # A partitioned table's primary key must contain the partition key.
+    op.execute("ALTER TABLE expense ADD CONSTRAINT expense_pkey PRIMARY KEY (id, created_at)")
+    op.execute("ALTER SEQUENCE expense_id_seq OWNED BY expense.id")
+    for column, table in (('seller_id', 'seller'), ('user_id', 'user'), ('project_id', 'project')):
+        op.execute(f'ALTER TABLE expense ADD FOREIGN KEY ({column}) REFERENCES "{table}" (id)')
+
+    # created_at is part of the primary key now, so it cannot be NULL. Date
+    # legacy rows without one by their owner's sign-up (or now); they are
+    # not in daily_expense_totals yet, so rerun `flask backfill-daily-totals`.
+    op.execute('UPDATE expense_unpartitioned SET created_at = COALESCE('
+               '(SELECT "user".created_at FROM "user" WHERE "user".id = expense_unpartitioned.user_id), now()) '
+               'WHERE created_at IS NULL')
+
+    first = op.get_bind().execute(sa.text("SELECT MIN(created_at) FROM expense_unpartitioned")).scalar()
+    month = date((first or datetime.utcnow()).year, (first or datetime.utcnow()).month, 1)
+    last = _add_months(date.today().replace(day=1), MONTHS_AHEAD)
+    while month <= last:
+        following = _add_months(month, 1)
+        op.execute(f"CREATE TABLE expense_y{month.year}m{month.month:02d} PARTITION OF expense "
+                   f"FOR VALUES FROM ('{month}') TO ('{following}')")
+        month = following
+    # Rows beyond the last monthly partition, until create-expense-partitions runs.
+    op.execute("CREATE TABLE expense_default PARTITION OF expense DEFAULT")
+
+    op.execute("INSERT INTO expense SELECT * FROM expense_unpartitioned")
+    op.execute("DROP TABLE expense_unpartitioned")
+    op.create_index('ix_expense_user_id_created_at', 'expense', ['user_id', 'created_at'], unique=False)
+    op.create_index('ix_expense_project_id_user_id', 'expense', ['project_id', 'user_id'], unique=False)
+    op.create_index('ix_expense_user_id_item_name', 'expense', ['user_id', 'item_name'], unique=False)
+
+    # The archive is partitioned the same way; archive.py moves whole monthly
+    # partitions into it.
+    op.execute("CREATE TABLE expense_archive (LIKE expense INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)")
+    op.execute("ALTER TABLE expense_archive ADD CONSTRAINT expense_archive_pkey PRIMARY KEY (id, created_at)")
+    for column, table in (('seller_id', 'seller'), ('user_id', 'user'), ('project_id', 'project')):
+        op.execute(f'ALTER TABLE expense_archive ADD FOREIGN KEY ({column}) REFERENCES "{table}" (id)')
+    op.execute("CREATE TABLE expense_archive_default PARTITION OF expense_archive DEFAULT")
+
+
+def _unpartition_postgresql():
+    op.execute("ALTER TABLE expense RENAME TO expense_partitioned")
+    op.execute("ALTER TABLE expense_partitioned RENAME CONSTRAINT expense_pkey TO expense_partitioned_pkey")
+    op.execute("ALTER SEQUENCE expense_id_seq OWNED BY NONE")
+    op.execute("CREATE TABLE expense (LIKE expense_partitioned INCLUDING DEFAULTS)")
+    op.execute("ALTER TABLE expense ADD CONSTRAINT expense_pkey PRIMARY KEY (id)")
+    op.execute("ALTER SEQUENCE expense_id_seq OWNED BY expense.id")
+    for column, table in (('seller_id', 'seller'), ('user_id', 'user'), ('project_id', 'project')):
+        op.execute(f'ALTER TABLE expense ADD FOREIGN KEY ({column}) REFERENCES "{table}" (id)')
+    op.execute("INSERT INTO expense SELECT * FROM expense_partitioned")
+    op.execute("INSERT INTO expense SELECT * FROM expense_archive")
+    op.execute("DROP TABLE expense_partitioned")
+    op.execute("DROP TABLE expense_archive")
+    op.create_index('ix_expense_user_id_created_at', 'expense', ['user_id', 'created_at'], unique=False)
+    op.create_index('ix_expense_project_id_user_id', 'expense', ['project_id', 'user_id'], unique=False)
+    op.create_index('ix_expense_user_id_item_name', 'expense', ['user_id', 'item_name'], unique=False)
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        _partition_postgresql()
+    else:
+        # Other databases keep one expense table; archived rows are moved to
+        # this plain table instead of to detached partitions.
+        op.create_table('expense_archive',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('expense_type', sa.String(length=50), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('item_name', sa.String(length=100), nullable=False),
+        sa.Column('unit_price', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('gst_amount', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('total_amount', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('invoice_number', sa.String(length=50), nullable=False),
+        sa.Column('seller_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('project_id', sa.Integer(), nullable=False),
+        sa.Column('updated_flag', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['project_id'], ['project.id'], ),
+        sa.ForeignKeyConstraint(['seller_id'], ['seller.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+    if op.get_bind().dialect.name == 'sqlite':
+        # Archived rows keep their ids; AUTOINCREMENT stops SQLite from
+        # reusing them for new expenses once the live table is empty.
+        with op.batch_alter_table('expense', schema=None, recreate='always',
+                                  table_kwargs={'sqlite_autoincrement': True}):
+            pass
+    with op.batch_alter_table('expense_archive', schema=None) as batch_op:
+        batch_op.create_index('ix_expense_archive_project_id_user_id', ['project_id', 'user_id'], unique=False)
+        batch_op.create_index('ix_expense_archive_user_id_created_at', ['user_id', 'created_at'], unique=False)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        _unpartition_postgresql()
+        return
+    # Archived expenses go back to the expense table.
+    op.execute("INSERT INTO expense SELECT * FROM expense_archive")
+    with op.batch_alter_table('expense_archive', schema=None) as batch_op:
+        batch_op.drop_index('ix_expense_archive_user_id_created_at')
+        batch_op.drop_index('ix_expense_archive_project_id_user_id')
+
+    op.drop_table('expense_archive')
+    if op.get_bind().dialect.name == 'sqlite':
+        with op.batch_alter_table('expense', schema=None, recreate='always'):
+            pass
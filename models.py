@@ -1,7 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
+from security import password_hasher
 
 db = SQLAlchemy()
 
@@ -11,6 +11,9 @@ class User(UserMixin, db.Model):
     designation = db.Column(db.String(50), nullable=False)
     password_hash = db.Column(db.String(256))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Bumped whenever the user's expenses, revenues or projects change; part
+    # of every cache key and API ETag.
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     expenses = db.relationship('Expense', backref='user', lazy=True)
     revenues = db.relationship('Revenue', backref='user', lazy=True)
@@ -18,11 +21,12 @@ class User(UserMixin, db.Model):
     # FIX: Add a relationship so we can easily get all projects for a user
     projects = db.relationship('Project', backref='user', lazy=True)
 
+    # Both run in password_hasher's bounded pool and may raise HasherBusy.
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
 
 class Seller(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -30,7 +34,8 @@ class Seller(db.Model):
     gstn = db.Column(db.String(15), unique=True, nullable=False)
     expenses = db.relationship('Expense', backref='seller', lazy=True)
 
-class Expense(db.Model):
+class ExpenseColumns:
+    """Columns shared by the live expense table and its archive."""
     id = db.Column(db.Integer, primary_key=True)
     expense_type = db.Column(db.String(50), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
@@ -45,19 +50,133 @@ class Expense(db.Model):
     updated_flag = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+class Expense(ExpenseColumns, db.Model):
+    """
+    Expenses of the open fiscal years. On PostgreSQL the table is range
+    partitioned by month on created_at (primary key (id, created_at)); see
+    archive.py.
+    """
+    # Composite indexes matching the per-user access paths in routes.py.
+    __table_args__ = (
+        db.Index('ix_expense_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_expense_project_id_user_id', 'project_id', 'user_id'),
+        db.Index('ix_expense_user_id_item_name', 'user_id', 'item_name'),
+        # Archived rows keep their ids, so SQLite must not hand them out again
+        # once the live table is emptied.
+        {'sqlite_autoincrement': True},
+    )
+
+class ExpenseArchive(ExpenseColumns, db.Model):
+    """
+    Expenses of closed fiscal years, moved here by `flask archive-expenses`.
+    The rollups still include them; queries.expense_history reads both tables.
+    """
+    __tablename__ = 'expense_archive'
+    __table_args__ = (
+        db.Index('ix_expense_archive_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_expense_archive_project_id_user_id', 'project_id', 'user_id'),
+    )
+
 class Project(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     
     # FIX: Add a user_id to link this project to the user who created it.
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
 
     expenses = db.relationship('Expense', backref='project', lazy=True)
     revenues = db.relationship('Revenue', backref='project', lazy=True)
 
 class Revenue(db.Model):
+    __table_args__ = (
+        db.Index('ix_revenue_user_id_created_at', 'user_id', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     total_estimated_revenue = db.Column(db.Numeric(10, 2), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ProjectTotals(db.Model):
+    """
+    Materialized per-project rollup read by the report page.
+    Kept current by aggregates.record_expenses/record_revenues in the same
+    transaction as the insert; `flask rebuild-project-totals` recomputes it.
+    """
+    __tablename__ = 'project_totals'
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    total_expenses = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    total_revenues = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    expense_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue_count = db.Column(db.Integer, nullable=False, default=0)
+
+    project = db.relationship('Project', backref=db.backref('totals', uselist=False))
+
+class DailyExpenseTotal(db.Model):
+    """
+    Per-user daily expense sums read by the forecast.
+    Maintained by aggregates.record_expenses; `flask backfill-daily-totals`
+    rebuilds it from the expense table.
+    """
+    __tablename__ = 'daily_expense_totals'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    total = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class DailySeriesTotal(db.Model):
+    """
+    Daily expense sums per user, project and expense type, read by the
+    per-project and per-type forecast series. Maintained and rebuilt
+    together with DailyExpenseTotal.
+    """
+    __tablename__ = 'daily_series_totals'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), primary_key=True)
+    expense_type = db.Column(db.String(50), primary_key=True)
+    total = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+def _search_key(length):
+    # Byte-order ("C") collation on PostgreSQL, so a plain b-tree index serves
+    # the prefix range scans in queries.prefix_filter; SQLite compares bytes
+    # already.
+    return db.String(length).with_variant(db.String(length, collation='C'), 'postgresql')
+
+class ItemCatalog(db.Model):
+    """
+    Distinct item names per user, for the report and the expense form's
+    type-ahead. Maintained by aggregates.record_expenses; `flask
+    rebuild-catalogs` rebuilds it from the expense table.
+    """
+    __tablename__ = 'item_catalog'
+    __table_args__ = (
+        db.Index('ix_item_catalog_user_id_name_key', 'user_id', 'name_key'),
+    )
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    name = db.Column(db.String(100), primary_key=True)
+    # Lower-cased name, searched by prefix.
+    name_key = db.Column(_search_key(100), nullable=False)
+    use_count = db.Column(db.Integer, nullable=False, default=0)
+    last_used_at = db.Column(db.DateTime)
+
+class SellerCatalog(db.Model):
+    """
+    The sellers each user has bought from, with the seller's name and GSTN
+    copied in so lookups need no join. Maintained like ItemCatalog.
+    """
+    __tablename__ = 'seller_catalog'
+    __table_args__ = (
+        db.Index('ix_seller_catalog_user_id_name_key', 'user_id', 'name_key'),
+        db.Index('ix_seller_catalog_user_id_gstn', 'user_id', 'gstn'),
+    )
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    seller_id = db.Column(db.Integer, db.ForeignKey('seller.id'), primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    name_key = db.Column(_search_key(100), nullable=False)
+    gstn = db.Column(_search_key(15), nullable=False)
+    use_count = db.Column(db.Integer, nullable=False, default=0)
+    last_used_at = db.Column(db.DateTime)
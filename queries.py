@@ -0,0 +1,355 @@
+"""
+Reusable query builders for the listing and reporting views.
+Keeps SQL shared by the HTML pages, JSON endpoints and CLI commands in one
+place so they all return exactly the same rows.
+"""
+import base64
+from datetime import datetime, timedelta
+from sqlalchemy import func, literal, tuple_, and_, or_, select, union_all
+from sqlalchemy.orm import make_transient_to_detached
+from models import (db, User, Seller, Project, Expense, ExpenseArchive, Revenue, ProjectTotals, DailyExpenseTotal,
+                    DailySeriesTotal, ItemCatalog, SellerCatalog)
+from cache import user_cache
+
+LEDGER_PAGE_SIZE = 50
+LEDGER_MAX_PAGE_SIZE = 500
+SUGGESTION_LIMIT = 10
+
+
+def encode_cursor(created_at, expense_id):
+    """Encodes the (created_at, id) position of a ledger row as an opaque token."""
+    raw = f"{created_at.isoformat()}|{expense_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Reverses encode_cursor. Raises ValueError on a malformed token."""
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        created_at, expense_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(expense_id)
+    except (UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def expense_history():
+    """
+    Live and archived expenses together (see archive.py), as a subquery with
+    the expense columns. Filters on it reach both tables' indexes.
+    """
+    columns = [column.name for column in Expense.__table__.columns]
+    return union_all(
+        select(*[Expense.__table__.c[name] for name in columns]),
+        select(*[ExpenseArchive.__table__.c[name] for name in columns]),
+    ).subquery('expense_history')
+
+
+def expense_ledger_query(user_id, project_id=None, gstn=None, expense_type=None,
+                         date_from=None, date_to=None, include_archived=False):
+    """
+    Builds the ledger query for one user, newest first.
+    Only the displayed columns are selected and the seller/project names come
+    from joins, so no ORM instances (or per-row lazy loads) are involved.
+    `date_to` is inclusive. Archived fiscal years are only read when
+    `include_archived` is set.
+    """
+    expense = expense_history().c if include_archived else Expense.__table__.c
+    query = db.session.query(
+        expense.id,
+        expense.created_at,
+        expense.expense_type,
+        expense.item_name,
+        expense.quantity,
+        expense.unit_price,
+        expense.gst_amount,
+        expense.total_amount,
+        expense.invoice_number,
+        expense.project_id,
+        Project.name.label('project_name'),
+        Seller.name.label('seller_name'),
+        Seller.gstn.label('seller_gstn'),
+    ).join(Project, Project.id == expense.project_id) \
+     .join(Seller, Seller.id == expense.seller_id) \
+     .filter(expense.user_id == user_id)
+
+    if project_id:
+        query = query.filter(expense.project_id == project_id)
+    if gstn:
+        query = query.filter(Seller.gstn == gstn)
+    if expense_type:
+        query = query.filter(expense.expense_type == expense_type)
+    if date_from:
+        query = query.filter(expense.created_at >= datetime.combine(date_from, datetime.min.time()))
+    if date_to:
+        query = query.filter(expense.created_at < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    return query.order_by(expense.created_at.desc(), expense.id.desc())
+
+
+def keyset_query(query, cursor=None, limit=LEDGER_PAGE_SIZE):
+    """
+    Restricts a ledger query ordered by (created_at, id) descending to the
+    page after `cursor`, plus one row to tell whether another page follows.
+    The query must select the id and created_at columns first, as
+    expense_ledger_query does.
+    """
+    if cursor:
+        created_at, expense_id = decode_cursor(cursor)
+        id_column, created_column = (column['expr'] for column in query.column_descriptions[:2])
+        query = query.filter(tuple_(created_column, id_column) < tuple_(created_at, expense_id))
+    return query.limit(limit + 1)
+
+
+def split_page(rows, limit=LEDGER_PAGE_SIZE):
+    """Turns the rows of a keyset_query into (rows, next_cursor)."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last.created_at, last.id)
+
+
+def keyset_page(query, cursor=None, limit=LEDGER_PAGE_SIZE):
+    """
+    Fetches one page of a ledger query ordered by (created_at, id) descending.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    return split_page(keyset_query(query, cursor, limit).all(), limit)
+
+
+def ledger_row_to_dict(row):
+    """Serializes a ledger row for the JSON endpoint."""
+    return {
+        'id': row.id,
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+        'expense_type': row.expense_type,
+        'item_name': row.item_name,
+        'quantity': row.quantity,
+        'unit_price': str(row.unit_price),
+        'gst_amount': str(row.gst_amount),
+        'total_amount': str(row.total_amount),
+        'invoice_number': row.invoice_number,
+        'project': {'id': row.project_id, 'name': row.project_name},
+        'seller': {'name': row.seller_name, 'gstn': row.seller_gstn},
+    }
+
+
+def project_totals_query(user_id=None, project_ids=None):
+    """
+    Computes per-project totals straight from the expense (live and archived)
+    and revenue tables.
+    Each side is aggregated in its own subquery before joining to Project, so
+    a project with m expenses and n revenues contributes 1 row, not m x n.
+    Used to (re)build the project_totals rollup; the report reads the rollup.
+    """
+    scope = db.session.query(Project.id)
+    if user_id is not None:
+        scope = scope.filter(Project.user_id == user_id)
+    if project_ids is not None:
+        scope = scope.filter(Project.id.in_(project_ids))
+    scope = scope.scalar_subquery()
+
+    expense = expense_history().c
+    expense_totals = db.session.query(
+        expense.project_id,
+        func.sum(expense.total_amount).label('total'),
+        func.count(expense.id).label('count'),
+    ).filter(expense.project_id.in_(scope)).group_by(expense.project_id).subquery()
+    revenue_totals = db.session.query(
+        Revenue.project_id,
+        func.sum(Revenue.total_estimated_revenue).label('total'),
+        func.count(Revenue.id).label('count'),
+    ).filter(Revenue.project_id.in_(scope)).group_by(Revenue.project_id).subquery()
+
+    query = db.session.query(
+        Project.id.label('project_id'),
+        Project.user_id,
+        func.coalesce(expense_totals.c.total, 0).label('total_expenses'),
+        func.coalesce(revenue_totals.c.total, 0).label('total_revenues'),
+        func.coalesce(expense_totals.c.count, 0).label('expense_count'),
+        func.coalesce(revenue_totals.c.count, 0).label('revenue_count'),
+    ).outerjoin(expense_totals, expense_totals.c.project_id == Project.id) \
+     .outerjoin(revenue_totals, revenue_totals.c.project_id == Project.id) \
+     .filter(Project.id.in_(scope))
+    return query
+
+
+def project_report_query(user_id):
+    """Per-project totals for the report page, read from the project_totals rollup."""
+    return db.session.query(
+        Project.id, Project.name, ProjectTotals.total_expenses, ProjectTotals.total_revenues
+    ).join(ProjectTotals, ProjectTotals.project_id == Project.id) \
+     .filter(ProjectTotals.user_id == user_id).order_by(Project.name)
+
+
+def month_bucket(column):
+    """A 'YYYY-MM' label for a timestamp column on the current database."""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return func.to_char(column, 'YYYY-MM')
+    return func.strftime('%Y-%m', column)
+
+
+def project_breakdown_queries(project_id, user_id):
+    """
+    Per-seller, per-expense-type and monthly spend for one project, each
+    aggregated by the database over live and archived expenses. Returns a
+    dict of queries keyed by the template variable they fill.
+    """
+    history = expense_history()
+    expense = history.c
+    scope = (expense.project_id == project_id, expense.user_id == user_id)
+    total = func.sum(expense.total_amount).label('total')
+    count = func.count(expense.id).label('count')
+    month = month_bucket(expense.created_at).label('month')
+    return {
+        'by_seller': db.session.query(Seller.name, Seller.gstn, total, count)
+                     .select_from(history).join(Seller, Seller.id == expense.seller_id).filter(*scope)
+                     .group_by(Seller.id, Seller.name, Seller.gstn).order_by(total.desc()),
+        'by_type': db.session.query(expense.expense_type, total, count).filter(*scope)
+                   .group_by(expense.expense_type).order_by(total.desc()),
+        'by_month': db.session.query(month, total, count).filter(*scope)
+                    .group_by(month).order_by(month),
+    }
+
+
+def project_choices_query(user_id):
+    """(id, name) of a user's projects, for form select fields."""
+    return db.session.query(Project.id, Project.name).filter(Project.user_id == user_id).order_by(Project.id)
+
+
+def search_key(name):
+    """
+    The catalogs' case-insensitive search key. Always computed in Python:
+    SQL lower() only folds ASCII on SQLite, so keys written by SQL would not
+    match the ones written on insert or the typed prefixes.
+    """
+    return name.lower()
+
+
+def prefix_filter(column, prefix):
+    """
+    `column` starts with `prefix`, as a range comparison so the b-tree index
+    on the column is used (LIKE would need a per-dialect index or collation).
+    """
+    return and_(column >= prefix, column < prefix + '\U0010ffff')
+
+
+def item_catalog_query(user_id, prefix=None):
+    """A user's distinct item names, alphabetically; `prefix` matches case-insensitively."""
+    query = db.session.query(ItemCatalog.name).filter(ItemCatalog.user_id == user_id)
+    if prefix:
+        query = query.filter(prefix_filter(ItemCatalog.name_key, search_key(prefix)))
+    return query.order_by(ItemCatalog.name_key)
+
+
+def seller_catalog_query(user_id, prefix=None):
+    """
+    (seller_id, name, gstn) of the sellers a user has bought from,
+    alphabetically; `prefix` matches the start of the name or the GSTN
+    (stored upper-cased, see forms.normalize_gstn).
+    """
+    query = db.session.query(SellerCatalog.seller_id, SellerCatalog.name, SellerCatalog.gstn)
+    if prefix:
+        # Written as two complete index lookups so either index can serve its half.
+        query = query.filter(or_(
+            and_(SellerCatalog.user_id == user_id, prefix_filter(SellerCatalog.name_key, search_key(prefix))),
+            and_(SellerCatalog.user_id == user_id, prefix_filter(SellerCatalog.gstn, prefix.upper())),
+        ))
+    else:
+        query = query.filter(SellerCatalog.user_id == user_id)
+    return query.order_by(SellerCatalog.name_key)
+
+
+def daily_totals_query(user_id, date_from=None, date_to=None):
+    """(day, total, count) per day with spending, oldest first, from the daily rollup."""
+    query = db.session.query(DailyExpenseTotal.day, DailyExpenseTotal.total, DailyExpenseTotal.count) \
+        .filter(DailyExpenseTotal.user_id == user_id)
+    if date_from:
+        query = query.filter(DailyExpenseTotal.day >= date_from)
+    if date_to:
+        query = query.filter(DailyExpenseTotal.day <= date_to)
+    return query.order_by(DailyExpenseTotal.day)
+
+
+def forecast_series_queries(user_id, since):
+    """
+    Daily spending from `since` on for every series the forecast covers, as
+    (key, label, day, total, count) rows keyed by series kind: the user's
+    total and one series per project and per expense type. All three read
+    the daily rollups, so their cost follows the number of days, not of
+    expenses (archived ones included).
+    """
+    series = DailySeriesTotal
+    return {
+        'total': db.session.query(DailyExpenseTotal.user_id.label('key'), literal('All expenses').label('label'),
+                                  DailyExpenseTotal.day.label('day'), DailyExpenseTotal.total.label('total'),
+                                  DailyExpenseTotal.count.label('count'))
+            .filter(DailyExpenseTotal.user_id == user_id, DailyExpenseTotal.day >= since),
+        'project': db.session.query(Project.id.label('key'), Project.name.label('label'), series.day.label('day'),
+                                    func.sum(series.total).label('total'), func.sum(series.count).label('count'))
+            .join(Project, series.project_id == Project.id)
+            .filter(series.user_id == user_id, series.day >= since)
+            .group_by(Project.id, Project.name, series.day),
+        'expense_type': db.session.query(series.expense_type.label('key'), series.expense_type.label('label'),
+                                         series.day.label('day'), func.sum(series.total).label('total'),
+                                         func.sum(series.count).label('count'))
+            .filter(series.user_id == user_id, series.day >= since)
+            .group_by(series.expense_type, series.day),
+    }
+
+
+def cached_project_choices(user_id, project_id=None):
+    """
+    project_choices_query as a list of tuples, served from user_cache. The
+    list is re-read when `project_id` (a submitted choice) is missing from
+    it, so a project just added through another worker is accepted.
+    """
+    key = f'projects:{user_id}'
+    choices = user_cache.get(key)
+    if choices is None or (project_id and project_id not in dict(choices)):
+        choices = [(project_id, name) for project_id, name in project_choices_query(user_id)]
+        user_cache.set(key, choices)
+    return choices
+
+
+def forget_project_choices(user_id):
+    """Drops the cached project choices after a user's projects change."""
+    user_cache.delete(f'projects:{user_id}')
+
+
+# Columns kept in the cached login user; the rest load on first access.
+CACHED_USER_COLUMNS = ('id', 'username', 'designation', 'created_at')
+
+
+def cached_user(user_id):
+    """
+    Returns the User for a session without a SELECT when it is cached.
+    The cached copy is re-attached to the current session as a persistent
+    object, so it can be used in relationships like a queried one.
+    """
+    key = f'user:{user_id}'
+    values = user_cache.get(key)
+    if values is None:
+        user = db.session.get(User, user_id)
+        if user is not None:
+            user_cache.set(key, {column: getattr(user, column) for column in CACHED_USER_COLUMNS})
+        return user
+    user = User(**values)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+def revenue_list_query(user_id):
+    """A user's revenue entries with their project name, newest first, as plain columns."""
+    return db.session.query(Revenue.id, Revenue.total_estimated_revenue, Revenue.created_at,
+                            Project.name.label('project_name')) \
+        .join(Project, Revenue.project_id == Project.id) \
+        .filter(Revenue.user_id == user_id) \
+        .order_by(Revenue.created_at.desc(), Revenue.id.desc())
+
+
+def project_revenues_query(project_id, user_id):
+    """Revenue entries for one project, newest first, as plain columns."""
+    return db.session.query(Revenue.id, Revenue.total_estimated_revenue, Revenue.created_at) \
+        .filter(Revenue.project_id == project_id, Revenue.user_id == user_id) \
+        .order_by(Revenue.created_at.desc(), Revenue.id.desc())
@@ -1,19 +1,29 @@
 """
 Defines all application routes and view functions.
 """
-from flask import Blueprint, render_template, redirect, url_for, request, flash
+from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify, abort, make_response
 from flask_login import login_user, logout_user, current_user, login_required
 from models import db, User, Seller, Project, Expense, Revenue
-from forms import LoginForm, RegistrationForm, ProjectForm, ExpenseForm, RevenueForm
-from sqlalchemy import func
-from statsmodels.tsa.arima.model import ARIMA
-import pandas as pd
-import numpy as np
-from decimal import Decimal
-from datetime import datetime, timedelta
+from forms import (LoginForm, RegistrationForm, ProjectForm, ExpenseForm, InvoiceForm, RevenueForm, LedgerFilterForm,
+                   ExpenseImportForm, MAX_INVOICE_LINES)
+from queries import (expense_ledger_query, keyset_page, ledger_row_to_dict, project_report_query,
+                     project_breakdown_queries, project_revenues_query, project_choices_query,
+                     revenue_list_query, cached_project_choices, forget_project_choices,
+                     item_catalog_query, seller_catalog_query,
+                     LEDGER_PAGE_SIZE, LEDGER_MAX_PAGE_SIZE, SUGGESTION_LIMIT)
+from aggregates import create_project_totals, record_expenses, record_revenues, money
+from importer import iter_rows, import_expenses
+from invoices import log_invoice
+from exports import (export_response, ledger_export_row, report_export_row, EXPORT_FORMATS,
+                     EXPORT_BATCH_SIZE, LEDGER_COLUMNS, REPORT_COLUMNS)
+from fragments import render_cached_page, fragment_key
+from security import password_hasher, login_limiter, HasherBusy
+from sqlalchemy.orm import joinedload
 
 routes = Blueprint('routes', __name__)
 
+PROJECT_REVENUE_LIMIT = 50
+
 # --- Authentication Routes ---
 # (No changes here)
 @routes.route('/login', methods=['GET', 'POST'])
@@ -22,10 +32,27 @@ def login():
         return redirect(url_for('routes.index'))
     form = LoginForm()
     if form.validate_on_submit():
-        user = User.query.filter_by(username=form.username.data).first()
-        if user is None or not user.check_password(form.password.data):
+        username = form.username.data
+        # Throttled attempts are turned away before any hashing work.
+        retry_after = login_limiter.retry_after(request.remote_addr, username)
+        if retry_after:
+            return _retry_later('login.html', 'Sign In', form, 429, retry_after,
+                                'Too many login attempts. Please wait and try again.')
+        user = User.query.filter_by(username=username).first()
+        try:
+            valid = password_hasher.verify(user.password_hash if user else None, form.password.data)
+            if valid and password_hasher.needs_rehash(user.password_hash):
+                # Hashed with older cost settings; upgrade while we have the password.
+                user.set_password(form.password.data)
+                db.session.commit()
+        except HasherBusy:
+            return _retry_later('login.html', 'Sign In', form, 503, 5,
+                                'The server is busy. Please try again in a few seconds.')
+        if not valid:
+            login_limiter.failed(request.remote_addr, username)
             flash('Invalid username or password.', 'danger')
             return redirect(url_for('routes.login'))
+        login_limiter.succeeded(username)
         login_user(user, remember=form.remember_me.data)
         return redirect(url_for('routes.index'))
     return render_template('login.html', title='Sign In', form=form)
@@ -36,14 +63,30 @@ def register():
         return redirect(url_for('routes.index'))
     form = RegistrationForm()
     if form.validate_on_submit():
+        retry_after = login_limiter.retry_after(request.remote_addr)
+        if retry_after:
+            return _retry_later('register.html', 'Register', form, 429, retry_after,
+                                'Too many attempts. Please wait and try again.')
+        login_limiter.attempted(request.remote_addr)
         user = User(username=form.username.data, designation=form.designation.data)
-        user.set_password(form.password.data)
+        try:
+            user.set_password(form.password.data)
+        except HasherBusy:
+            return _retry_later('register.html', 'Register', form, 503, 5,
+                                'The server is busy. Please try again in a few seconds.')
         db.session.add(user)
         db.session.commit()
         flash('Registration successful! Please log in.', 'success')
         return redirect(url_for('routes.login'))
     return render_template('register.html', title='Register', form=form)
 
+def _retry_later(template, title, form, status, retry_after, message):
+    """Re-renders an auth form with a 429/503 status and a Retry-After header."""
+    flash(message, 'danger')
+    response = make_response(render_template(template, title=title, form=form), status)
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
 @routes.route('/logout')
 @login_required
 def logout():
@@ -58,58 +101,192 @@ def logout():
 def index():
     return render_template('index.html')
 
+def _ledger_filters(project_choices):
+    """Parses the ledger filter query string. Returns (filter_form, filter_kwargs)."""
+    filter_form = LedgerFilterForm(request.args)
+    filter_form.project_id.choices = [(0, 'All projects')] + project_choices
+    if request.args and not filter_form.validate():
+        return filter_form, None
+    return filter_form, filter_form.filters()
+
+def _ledger_page(filters, limit=LEDGER_PAGE_SIZE):
+    """Returns (rows, next_cursor) for the current user's filtered ledger."""
+    query = expense_ledger_query(current_user.id, **filters)
+    try:
+        return keyset_page(query, request.args.get('cursor'), limit)
+    except ValueError:
+        abort(400)
+
+def _project_choices(project_id=None):
+    if project_id is None:
+        project_id = request.values.get('project_id', type=int)
+    return cached_project_choices(current_user.id, project_id)
+
 @routes.route('/expenses', methods=['GET', 'POST'])
 @login_required
 def log_expenses():
     form = ExpenseForm()
-    form.project_id.choices = [(p.id, p.name) for p in Project.query.filter_by(user_id=current_user.id).all()]
+    project_choices = _project_choices()
+    form.project_id.choices = project_choices
     if form.validate_on_submit():
         try:
             seller = Seller.query.filter_by(gstn=form.gstn.data.strip()).first()
             if not seller:
                 seller = Seller(name=form.seller_name.data.strip(), gstn=form.gstn.data.strip())
                 db.session.add(seller)
-            project = Project.query.get(form.project_id.data)
-            total_amount = (Decimal(form.unit_price.data) * Decimal(form.quantity.data)) + Decimal(form.gst_amount.data)
+            unit_price, gst_amount = money(form.unit_price.data), money(form.gst_amount.data)
             expense = Expense(
                 expense_type=form.expense_type.data,
                 item_name=form.item_name.data.strip(),
                 quantity=form.quantity.data,
-                unit_price=form.unit_price.data,
-                gst_amount=form.gst_amount.data,
-                total_amount=total_amount,
+                unit_price=unit_price,
+                gst_amount=gst_amount,
+                total_amount=unit_price * form.quantity.data + gst_amount,
                 invoice_number=form.invoice_number.data.strip(),
                 seller=seller,
-                project=project,
-                user=current_user
+                # Choices are limited to the user's own projects, so the
+                # validated id can be used without loading the project.
+                project_id=form.project_id.data,
+                user_id=current_user.id
             )
             db.session.add(expense)
+            db.session.flush()
+            record_expenses([{'user_id': expense.user_id, 'project_id': expense.project_id,
+                              'expense_type': expense.expense_type, 'item_name': expense.item_name, 'seller_id': expense.seller_id,
+                              'total_amount': expense.total_amount, 'created_at': expense.created_at}])
             db.session.commit()
             flash('Expense logged successfully!', 'success')
             return redirect(url_for('routes.log_expenses'))
         except Exception as e:
             db.session.rollback()
             flash(f"An error occurred: {str(e)}", 'danger')
-    expenses = Expense.query.filter_by(user_id=current_user.id).order_by(Expense.created_at.desc()).all()
-    return render_template('expenses.html', form=form, expenses=expenses)
+    filter_form, filters = _ledger_filters(project_choices)
+    expenses, next_cursor = _ledger_page(filters) if filters is not None else ([], None)
+    # Only the filter arguments are carried into the "older entries" link.
+    filter_args = {k: v for k, v in request.args.items() if k not in ('cursor', 'submit')}
+    return render_template('expenses.html', form=form, filter_form=filter_form, expenses=expenses,
+                           next_cursor=next_cursor, filter_args=filter_args)
+
+@routes.route('/expenses/invoice', methods=['GET', 'POST'])
+@login_required
+def log_invoice_lines():
+    """
+    Logs every line item of an invoice in one transaction. Accepts the HTML
+    form or a JSON body: {"invoice_number", "seller_name", "gstn",
+    "project_id", "lines": [{"expense_type", "item_name", "quantity",
+    "unit_price", "gst_amount"}, ...]}.
+    """
+    if request.is_json:
+        formdata = InvoiceForm.formdata_from_json(request.get_json(silent=True))
+        if formdata is None:
+            return jsonify({'errors': {'lines': ['Expected an object with a list of lines.']}}), 400
+        # Browsers cannot send a cross-site JSON POST without a CORS
+        # preflight, so the session cookie is enough here.
+        form = InvoiceForm(formdata=formdata, meta={'csrf': False})
+    else:
+        form = InvoiceForm()
+    form.project_id.choices = _project_choices(form.project_id.data)
+    if form.validate_on_submit():
+        try:
+            rows = log_invoice(current_user.id, form.project_id.data, form.invoice_number.data,
+                               form.seller_name.data, form.gstn.data, form.lines.data)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            if request.is_json:
+                return jsonify({'errors': {'invoice': [str(e)]}}), 500
+            flash(f"An error occurred: {str(e)}", 'danger')
+        else:
+            total = sum(row['total_amount'] for row in rows)
+            if request.is_json:
+                return jsonify({'invoice_number': rows[0]['invoice_number'], 'lines': len(rows),
+                                'line_totals': [str(row['total_amount']) for row in rows],
+                                'total': str(total)}), 201
+            flash(f"Invoice {rows[0]['invoice_number']} logged: {len(rows)} line item(s), total ₹{total}.", 'success')
+            return redirect(url_for('routes.log_expenses'))
+    elif request.is_json:
+        return jsonify({'errors': form.errors}), 400
+    return render_template('invoice.html', form=form, max_lines=MAX_INVOICE_LINES)
+
+@routes.route('/expenses/ledger')
+@login_required
+def expense_ledger():
+    """JSON version of the ledger table, with the same filters and cursor."""
+    project_choices = _project_choices()
+    filter_form, filters = _ledger_filters(project_choices)
+    if filters is None:
+        return jsonify({'errors': filter_form.errors}), 400
+    limit = min(request.args.get('limit', LEDGER_PAGE_SIZE, type=int), LEDGER_MAX_PAGE_SIZE)
+    if limit < 1:
+        abort(400)
+    rows, next_cursor = _ledger_page(filters, limit)
+    return jsonify({'expenses': [ledger_row_to_dict(row) for row in rows], 'next_cursor': next_cursor})
+
+@routes.route('/expenses/suggest')
+@login_required
+def suggest():
+    """Type-ahead for the expense form: ?field=item|seller&q=<prefix>."""
+    prefix = request.args.get('q', '').strip()
+    field = request.args.get('field')
+    if field == 'item':
+        rows = item_catalog_query(current_user.id, prefix).limit(SUGGESTION_LIMIT)
+        return jsonify({'items': [name for name, in rows]})
+    if field == 'seller':
+        rows = seller_catalog_query(current_user.id, prefix).limit(SUGGESTION_LIMIT)
+        return jsonify({'sellers': [{'name': name, 'gstn': gstn} for _, name, gstn in rows]})
+    abort(400)
+
+@routes.route('/expenses/export.<fmt>')
+@login_required
+def export_expenses(fmt):
+    """Streams the whole (filtered) ledger. Add ?gzip=1 for a compressed download."""
+    if fmt not in EXPORT_FORMATS:
+        abort(404)
+    project_choices = _project_choices()
+    filter_form, filters = _ledger_filters(project_choices)
+    if filters is None:
+        abort(400)
+    rows = expense_ledger_query(current_user.id, **filters).yield_per(EXPORT_BATCH_SIZE)
+    return export_response(fmt, 'expenses', LEDGER_COLUMNS, (ledger_export_row(row) for row in rows),
+                           compress=request.args.get('gzip', type=int) == 1)
+
+@routes.route('/expenses/import', methods=['GET', 'POST'])
+@login_required
+def import_expenses_file():
+    form = ExpenseImportForm()
+    report = None
+    if form.validate_on_submit():
+        upload = form.file.data
+        try:
+            report = import_expenses(current_user.id, iter_rows(upload.stream, upload.filename))
+        except (ValueError, UnicodeDecodeError) as e:
+            flash(f"Could not read the file: {e}", 'danger')
+            return redirect(url_for('routes.import_expenses_file'))
+        flash(f"Imported {report.inserted} expense(s); {len(report.errors)} row(s) rejected.",
+              'success' if not report.errors else 'warning')
+    return render_template('import_expenses.html', form=form, report=report)
     
 @routes.route('/revenue', methods=['GET', 'POST'])
 @login_required
 def log_revenue():
     form = RevenueForm()
-    form.project_id.choices = [(p.id, p.name) for p in Project.query.filter_by(user_id=current_user.id).all()]
+    form.project_id.choices = _project_choices()
     if form.validate_on_submit():
-        project = Project.query.get(form.project_id.data)
         revenue = Revenue(
-            total_estimated_revenue=form.total_estimated_revenue.data,
-            project=project,
-            user=current_user
+            total_estimated_revenue=money(form.total_estimated_revenue.data),
+            project_id=form.project_id.data,
+            user_id=current_user.id
         )
         db.session.add(revenue)
+        db.session.flush()
+        record_revenues([{'user_id': revenue.user_id, 'project_id': revenue.project_id,
+                          'total_estimated_revenue': revenue.total_estimated_revenue}])
         db.session.commit()
         flash('Revenue logged successfully!', 'success')
         return redirect(url_for('routes.log_revenue'))
-    revenues = Revenue.query.filter_by(user_id=current_user.id).order_by(Revenue.created_at.desc()).all()
+    # Plain columns with the project name joined in; rendering Revenue objects
+    # would lazy-load each row's project.
+    revenues = revenue_list_query(current_user.id).all()
     return render_template('revenue.html', form=form, revenues=revenues)
 
 @routes.route('/projects', methods=['GET', 'POST'])
@@ -119,87 +296,75 @@ def manage_projects():
     if form.validate_on_submit():
         project = Project(name=form.name.data, user=current_user)
         db.session.add(project)
+        create_project_totals(project)
         db.session.commit()
+        forget_project_choices(current_user.id)
         flash('Project added successfully!', 'success')
         return redirect(url_for('routes.manage_projects'))
-    projects = Project.query.filter_by(user_id=current_user.id).all()
+    projects = project_choices_query(current_user.id).all()
     return render_template('projects.html', form=form, projects=projects)
 
 @routes.route('/projects/<int:id>')
 @login_required
 def view_project(id):
+    cursor = request.args.get('cursor')
+
+    def build_context():
+        project = Project.query.options(joinedload(Project.totals)) \
+            .filter_by(id=id, user_id=current_user.id).first_or_404()
+        totals = project.totals
+        breakdowns = {name: query.all() for name, query in project_breakdown_queries(id, current_user.id).items()}
+        # Only one page of line items is loaded; totals and breakdowns come from SQL.
+        query = expense_ledger_query(current_user.id, project_id=id)
+        try:
+            expenses, next_cursor = keyset_page(query, cursor)
+        except ValueError:
+            abort(400)
+        revenues = project_revenues_query(id, current_user.id).limit(PROJECT_REVENUE_LIMIT).all()
+        return dict(project=project, expenses=expenses, next_cursor=next_cursor,
+                    revenues=revenues, revenue_limit=PROJECT_REVENUE_LIMIT,
+                    total_expenses=totals.total_expenses if totals else 0,
+                    total_revenues=totals.total_revenues if totals else 0,
+                    revenue_count=totals.revenue_count if totals else 0,
+                    **breakdowns)
+
+    return render_cached_page('view_project.html', fragment_key('view_project.html', current_user.id, id, cursor),
+                              build_context)
+
+@routes.route('/projects/<int:id>/export.<fmt>')
+@login_required
+def export_project(id, fmt):
+    if fmt not in EXPORT_FORMATS:
+        abort(404)
     project = Project.query.filter_by(id=id, user_id=current_user.id).first_or_404()
-    expenses = Expense.query.filter_by(project_id=id, user_id=current_user.id).all()
-    revenues = Revenue.query.filter_by(project_id=id, user_id=current_user.id).all()
-    total_expenses = sum(e.total_amount for e in expenses)
-    total_revenues = sum(r.total_estimated_revenue for r in revenues)
-    return render_template('view_project.html', project=project, expenses=expenses,
-                           revenues=revenues, total_expenses=total_expenses,
-                           total_revenues=total_revenues)
+    rows = expense_ledger_query(current_user.id, project_id=project.id,
+                                include_archived=True).yield_per(EXPORT_BATCH_SIZE)
+    return export_response(fmt, f'project-{project.id}-expenses', LEDGER_COLUMNS,
+                           (ledger_export_row(row) for row in rows),
+                           compress=request.args.get('gzip', type=int) == 1)
 
 @routes.route('/report')
 @login_required
 def report():
-    project_reports_query = db.session.query(
-        Project.name,
-        func.sum(Expense.total_amount).label('total_expenses'),
-        func.sum(Revenue.total_estimated_revenue).label('total_revenues')
-    ).select_from(Project).filter(Project.user_id == current_user.id).outerjoin(Expense, (Project.id == Expense.project_id)).outerjoin(Revenue, (Project.id == Revenue.project_id)).group_by(Project.name).all()
-    project_reports = [
-        {'name': name, 'total_expenses': expenses or 0, 'total_revenues': revenues or 0}
-        for name, expenses, revenues in project_reports_query
-    ]
-    sellers = Seller.query.join(Expense).filter(Expense.user_id == current_user.id).distinct().all()
-    item_names_tuples = db.session.query(Expense.item_name).filter(Expense.user_id == current_user.id).distinct().all()
-    items = [item[0] for item in item_names_tuples if item[0]]
-    return render_template('report.html', project_reports=project_reports, sellers=sellers, items=items)
-
-@routes.route('/forecast')
-@login_required
-def forecast():
-    expenses_over_time = Expense.query.filter_by(user_id=current_user.id).order_by(Expense.created_at).all()
-    
-    if len(expenses_over_time) < 10:
-        flash("Not enough expense data for a reliable forecast.", "warning")
-        return redirect(url_for('routes.index'))
+    def build_context():
+        # Totals come from the project_totals rollup: one row per project, no
+        # joins against the expense or revenue tables.
+        project_reports = [
+            {'name': name, 'total_expenses': expenses, 'total_revenues': revenues}
+            for _, name, expenses, revenues in project_report_query(current_user.id)
+        ]
+        # Distinct sellers and items come from the per-user catalogs, not the expense table.
+        sellers = seller_catalog_query(current_user.id).all()
+        items = [name for name, in item_catalog_query(current_user.id) if name]
+        return dict(project_reports=project_reports, sellers=sellers, items=items)
 
-    data = {exp.created_at: float(exp.total_amount) for exp in expenses_over_time}
-    series = pd.Series(data)
-    daily_series = series.resample('D').sum()
-
-    if len(daily_series[daily_series > 0]) < 5:
-        flash("Generating a demo forecast with sample historical data.", "info")
-        today = datetime.now()
-        fake_data = {
-            today - timedelta(days=i): np.random.uniform(10000, 50000) for i in range(1, 11)
-        }
-        todays_total = daily_series.sum()
-        if todays_total > 0:
-            fake_data[today] = todays_total
-        daily_series = pd.Series(fake_data)
-    
-    daily_series_cleaned = daily_series[daily_series > 0]
-    log_transformed_series = np.log(daily_series_cleaned)
+    return render_cached_page('report.html', fragment_key('report.html', current_user.id), build_context)
 
-    try:
-        model = ARIMA(log_transformed_series, order=(1, 1, 1))
-        model_fit = model.fit()
-
-        # FIX: Get the raw forecast values and generate dates manually for reliability.
-        forecast_values = model_fit.forecast(steps=7).values
-        inverse_transformed_values = np.exp(forecast_values)
-
-        # Get the last date from our data to start the forecast from the next day.
-        last_date = log_transformed_series.index[-1]
-        forecast_dates = pd.date_range(start=last_date + timedelta(days=1), periods=7)
-
-        # Combine the generated dates and the forecast values.
-        formatted_forecast = {
-            date.strftime('%Y-%m-%d'): round(value, 2)
-            for date, value in zip(forecast_dates, inverse_transformed_values)
-        }
-
-        return render_template('forecast.html', forecast=formatted_forecast)
-    except Exception as e:
-        flash(f"Could not generate forecast: {e}", "danger")
-        return redirect(url_for('routes.index'))
+@routes.route('/report/export.<fmt>')
+@login_required
+def export_report(fmt):
+    if fmt not in EXPORT_FORMATS:
+        abort(404)
+    rows = project_report_query(current_user.id).yield_per(EXPORT_BATCH_SIZE)
+    return export_response(fmt, 'project-totals', REPORT_COLUMNS, (report_export_row(row) for row in rows),
+                           compress=request.args.get('gzip', type=int) == 1)
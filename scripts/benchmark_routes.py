@@ -0,0 +1,211 @@
+"""
+Route benchmark.
+
+Fills a throwaway database with a synthetic dataset (synthetic_data.py),
+logs in as its busiest user and drives the main pages through the Flask
+test client. For each route it reports latency percentiles, SQL statements
+per request and the peak Python memory allocated while rendering it, plus
+the peak RSS of the whole run.
+
+The forecast is fitted once before timing starts, so /forecast measures
+serving a cached forecast; the one-off fit time is printed separately.
+Likewise /report and /projects/<id> are served from the fragment cache
+after the first request; pass --cold to clear it before every request and
+measure the full render instead.
+
+Usage:
+    python scripts/benchmark_routes.py --scale 100k --save before.json
+    # ... change something ...
+    python scripts/benchmark_routes.py --scale 100k --baseline before.json
+
+With --baseline the run fails if any route's p95 grew by more than
+--max-regression (default 25%) and --min-delta-ms, or it issues more
+queries than before.
+Compare runs of the same scale on the same machine only.
+
+To benchmark an existing generated database instead of reseeding, pass
+--database-url and --no-seed. Never point --database-url at a database
+holding real data: unless --no-seed is given the script drops all tables.
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic_data import generate, SCALES, PASSWORD
+from load_test import percentile
+
+ROUTES = ('/expenses', '/revenue', '/projects/<id>', '/report', '/forecast')
+FORECAST_TIMEOUT = 300
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=sorted(SCALES), default='10k')
+    parser.add_argument('--database-url', help='Scratch database (default: temporary SQLite file).')
+    parser.add_argument('--no-seed', action='store_true', help='Benchmark the existing data in --database-url.')
+    parser.add_argument('--requests', type=int, default=50, help='Timed requests per route (default: 50).')
+    parser.add_argument('--cold', action='store_true', help='Clear the fragment cache before every request.')
+    parser.add_argument('--save', metavar='FILE', help='Write the results to FILE as JSON.')
+    parser.add_argument('--baseline', metavar='FILE', help='Compare against results saved with --save.')
+    parser.add_argument('--max-regression', type=float, default=0.25,
+                        help='Allowed p95 growth over the baseline, as a fraction (default: 0.25).')
+    parser.add_argument('--min-delta-ms', type=float, default=5,
+                        help='Ignore p95 growth smaller than this, which is timer noise (default: 5).')
+    return parser.parse_args()
+
+
+def busiest_project(db, user_id):
+    from sqlalchemy import func
+    from models import Expense
+    return (db.session.query(Expense.project_id).filter(Expense.user_id == user_id)
+            .group_by(Expense.project_id).order_by(func.count().desc()).limit(1).scalar())
+
+
+def wait_for_forecast(client):
+    """Triggers the forecast fit and waits for it; returns the seconds it took."""
+    started = time.perf_counter()
+    client.get('/forecast')
+    while time.perf_counter() - started < FORECAST_TIMEOUT:
+        status = client.get('/forecast/status').get_json()['status']
+        if status != 'pending':
+            if status != 'ready':
+                raise SystemExit(f"Forecast ended with status {status!r}")
+            return time.perf_counter() - started
+        time.sleep(0.2)
+    raise SystemExit(f"Forecast not ready after {FORECAST_TIMEOUT} s")
+
+
+def measure(client, engine, url, requests, cold=False):
+    """Times `requests` GETs of `url`, then traces one more for memory."""
+    from sqlalchemy import event
+    from cache import fragment_cache
+
+    statements = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    latencies, queries = [], set()
+    event.listen(engine, 'before_cursor_execute', _count)
+    try:
+        for _ in range(requests):
+            if cold:
+                fragment_cache.clear()
+            statements.clear()
+            started = time.perf_counter()
+            response = client.get(url)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise SystemExit(f"GET {url} returned {response.status_code}")
+            queries.add(len(statements))
+    finally:
+        event.remove(engine, 'before_cursor_execute', _count)
+
+    # Tracing slows allocation down, so it is kept out of the timed requests.
+    if cold:
+        fragment_cache.clear()
+    tracemalloc.start()
+    client.get(url)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        'p50_ms': percentile(latencies, 0.50) * 1000, 'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000, 'max_ms': latencies[-1] * 1000,
+        'queries': max(queries), 'peak_kb': peak / 1024,
+    }
+
+
+def compare(results, baseline, max_regression, min_delta_ms):
+    """Prints the regressions against `baseline`; returns how many routes regressed."""
+    failures = 0
+    for route, current in results['routes'].items():
+        before = baseline['routes'].get(route)
+        if before is None:
+            continue
+        problems = []
+        if (current['p95_ms'] > before['p95_ms'] * (1 + max_regression)
+                and current['p95_ms'] - before['p95_ms'] >= min_delta_ms):
+            problems.append(f"p95 {before['p95_ms']:.1f} -> {current['p95_ms']:.1f} ms")
+        if current['queries'] > before['queries']:
+            problems.append(f"queries {before['queries']} -> {current['queries']}")
+        if problems:
+            print(f"[FAIL] {route}: {', '.join(problems)}")
+            failures += 1
+    return failures
+
+
+def main():
+    args = parse_args()
+    if args.no_seed and not args.database_url:
+        raise SystemExit('--no-seed needs --database-url.')
+    os.environ['DATABASE_URL'] = args.database_url or \
+        'sqlite:///' + os.path.join(tempfile.mkdtemp(), f'benchmark_{args.scale}.db')
+    # A fresh dataset restarts at data version 0; never reuse the shared cache files.
+    os.environ['FRAGMENT_CACHE_BACKEND'] = 'memory'
+    os.environ['FORECAST_CACHE_BACKEND'] = 'memory'
+    os.environ['USER_CACHE_BACKEND'] = 'memory'
+
+    from app import app
+    from models import db
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        if not args.no_seed:
+            db.drop_all()
+            db.create_all()
+            started = time.perf_counter()
+            generate(db, **SCALES[args.scale])
+            print(f"Seeded {args.scale} expenses in {time.perf_counter() - started:.1f} s")
+        project_id = busiest_project(db, user_id=1)
+        engine = db.engine
+
+    results = {'scale': args.scale, 'dialect': engine.dialect.name, 'requests': args.requests, 'cold': args.cold,
+               'routes': {}}
+    with app.test_client() as client:
+        client.post('/login', data={'username': 'user1', 'password': PASSWORD})
+        results['forecast_fit_s'] = wait_for_forecast(client)
+        print(f"Forecast fitted in {results['forecast_fit_s']:.1f} s")
+
+        print(f"{'route':<16}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'queries':>9}{'peak KB':>9}")
+        for route in ROUTES:
+            url = route.replace('<id>', str(project_id))
+            # One untimed request fills the per-user caches.
+            client.get(url)
+            stats = results['routes'][route] = measure(client, engine, url, args.requests, args.cold)
+            print(f"{route:<16}{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}"
+                  f"{stats['max_ms']:>9.1f}{stats['queries']:>9}{stats['peak_kb']:>9.0f}")
+
+    results['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"Peak RSS {results['peak_rss_mb']:.0f} MB")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved to {args.save}")
+
+    failures = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('scale') != args.scale or baseline.get('cold', False) != args.cold:
+            print("Warning: the baseline was run with a different --scale or --cold setting.")
+        failures = compare(results, baseline, args.max_regression, args.min_delta_ms)
+        print(f"\n{failures} route{'' if failures == 1 else 's'} regressed against {args.baseline}.")
+
+    if args.database_url and not args.no_seed:
+        with app.app_context():
+            db.drop_all()
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
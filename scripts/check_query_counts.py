@@ -0,0 +1,115 @@
+"""
+Query-count regression check.
+
+Renders the listing pages against a small and a ten times larger synthetic
+dataset and counts the SQL statements each request issues. A page whose
+count grows with the number of rows is doing per-row lazy loads (N+1); the
+check fails if any count differs between the two datasets or exceeds
+MAX_QUERIES.
+
+Usage:
+    python scripts/check_query_counts.py
+    python scripts/check_query_counts.py --database-url postgresql://.../scratch_db
+
+Never point --database-url at a database holding real data: the script
+creates and drops all tables.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic_data import generate
+
+# Upper bound on statements per page, including the session's user lookup.
+MAX_QUERIES = 12
+PAGES = ('/expenses', '/revenue', '/projects', '/projects/1', '/report')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Scratch database to seed (default: temporary SQLite file).')
+    parser.add_argument('--expenses', type=int, default=500, help='Expenses in the small dataset.')
+    return parser.parse_args()
+
+
+def count_queries(app, db, scale, expenses):
+    """
+    Seeds `scale` times the base dataset and returns {page: statements issued}.
+    Projects grow with the data too: the session's identity map loads each
+    related project once per request, so a fixed project count would hide
+    lazy loads from the listings.
+    """
+    from sqlalchemy import event
+    from cache import user_cache, fragment_cache
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        generate(db, expenses=expenses * scale, users=2, projects_per_user=3 * scale,
+                 sellers=20 * scale, revenues=expenses * scale // 5)
+        engine = db.engine
+    user_cache.clear()
+
+    statements = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    counts = {}
+    with app.test_client() as client:
+        client.post('/login', data={'username': 'user1', 'password': 'password'})
+        # Warm user_cache first so both datasets are measured in the same state.
+        for page in PAGES:
+            client.get(page)
+        event.listen(engine, 'before_cursor_execute', _count)
+        try:
+            for page in PAGES:
+                # Count the full render, not a cached fragment.
+                fragment_cache.clear()
+                statements.clear()
+                response = client.get(page)
+                if response.status_code != 200:
+                    raise SystemExit(f"GET {page} returned {response.status_code}")
+                counts[page] = len(statements)
+        finally:
+            event.remove(engine, 'before_cursor_execute', _count)
+    return counts
+
+
+def main():
+    args = parse_args()
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'query_counts.db')
+    # Both datasets start at data version 0; never reuse the shared cache files.
+    os.environ['FRAGMENT_CACHE_BACKEND'] = 'memory'
+    os.environ['FORECAST_CACHE_BACKEND'] = 'memory'
+    os.environ['USER_CACHE_BACKEND'] = 'memory'
+
+    from app import app
+    from models import db
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    small = count_queries(app, db, 1, args.expenses)
+    large = count_queries(app, db, 10, args.expenses)
+    if args.database_url:
+        with app.app_context():
+            db.drop_all()
+
+    failures = 0
+    print(f"{'':7}{'page':<16}{args.expenses:>8}{args.expenses * 10:>10}")
+    for page in PAGES:
+        failed = small[page] != large[page] or large[page] > MAX_QUERIES
+        print(f"[{'FAIL' if failed else ' OK '}] {page:<16}{small[page]:>8}{large[page]:>10}")
+        failures += failed
+
+    print(f"\n{failures} page{'' if failures == 1 else 's'} issued a row-dependent or excessive number of queries.")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
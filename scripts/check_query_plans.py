@@ -0,0 +1,125 @@
+"""
+Query-plan regression check.
+
+Seeds a throwaway database with a large synthetic dataset (synthetic_data.py), then runs EXPLAIN
+on the query behind each route and fails if any of them falls back to a
+sequential scan of the expense (live, monthly partitions or archive),
+revenue, project or rollup tables.
+
+Usage:
+    python scripts/check_query_plans.py                 # temporary SQLite file
+    python scripts/check_query_plans.py --database-url postgresql://.../scratch_db
+
+Never point --database-url at a database holding real data: the script
+creates and drops all tables.
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic_data import generate
+
+HOT_TABLES = ('expense', 'expense_archive', r'expense_y\d{4}m\d{2}', 'revenue', 'project', 'project_totals',
+              'item_catalog', 'seller_catalog', 'daily_expense_totals', 'daily_series_totals')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Scratch database to seed (default: temporary SQLite file).')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--projects-per-user', type=int, default=5)
+    parser.add_argument('--expenses', type=int, default=100_000)
+    parser.add_argument('--revenues', type=int, default=5_000)
+    parser.add_argument('--sellers', type=int, default=500)
+    return parser.parse_args()
+
+
+def route_queries(db, models, user_id, project_id):
+    """The queries issued by each route, keyed by a descriptive name."""
+    from queries import (expense_ledger_query, project_report_query, project_breakdown_queries,
+                         project_revenues_query, project_choices_query, revenue_list_query,
+                         forecast_series_queries, item_catalog_query, seller_catalog_query)
+    User, Seller, Project, Expense, Revenue = models
+    return {
+        'log_expenses: project choices': project_choices_query(user_id),
+        'log_expenses: ledger page': expense_ledger_query(user_id).limit(51),
+        'log_expenses: ledger filtered by project': expense_ledger_query(user_id, project_id=project_id).limit(51),
+        'log_revenue: revenue list': revenue_list_query(user_id),
+        'manage_projects: project list': project_choices_query(user_id),
+        'log_expenses: ledger including archived years':
+            expense_ledger_query(user_id, include_archived=True).limit(51),
+        'view_project: expense page': expense_ledger_query(user_id, project_id=project_id).limit(51),
+        'view_project: revenues': project_revenues_query(project_id, user_id).limit(50),
+        **{f'view_project: spend {name}': query
+           for name, query in project_breakdown_queries(project_id, user_id).items()},
+        'report: project totals': project_report_query(user_id),
+        'report: sellers': seller_catalog_query(user_id),
+        'report: item names': item_catalog_query(user_id),
+        'suggest: items': item_catalog_query(user_id, 'soft').limit(10),
+        'suggest: sellers': seller_catalog_query(user_id, 'sel').limit(10),
+        **{f'forecast: {kind} series': query
+           for kind, query in forecast_series_queries(user_id, date.today() - timedelta(days=365)).items()},
+    }
+
+
+def explain(db, query):
+    """Returns the plan lines for a query on the current dialect."""
+    dialect = db.engine.dialect.name
+    sql = str(query.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    if dialect == 'sqlite':
+        return [row[-1] for row in db.session.execute(db.text('EXPLAIN QUERY PLAN ' + sql))]
+    return [row[0] for row in db.session.execute(db.text('EXPLAIN ' + sql))]
+
+
+def full_scans(plan, dialect):
+    """Plan lines that read one of the hot tables without an index."""
+    if dialect == 'sqlite':
+        pattern = re.compile(r'^SCAN (%s)\b(?!.*USING)' % '|'.join(HOT_TABLES))
+    else:
+        pattern = re.compile(r'Seq Scan on "?(%s)"?\b' % '|'.join(HOT_TABLES))
+    return [line for line in plan if pattern.search(line.strip())]
+
+
+def main():
+    args = parse_args()
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'query_plans.db')
+
+    from app import app
+    from models import db, User, Seller, Project, Expense, Revenue
+    models = (User, Seller, Project, Expense, Revenue)
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        print(f"Seeding {args.expenses} expenses into {db.engine.url.render_as_string(hide_password=True)} ...")
+        generate(db, expenses=args.expenses, users=args.users, projects_per_user=args.projects_per_user,
+                 sellers=args.sellers, revenues=args.revenues)
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+
+        dialect = db.engine.dialect.name
+        failures = 0
+        for name, query in route_queries(db, models, user_id=1, project_id=1).items():
+            plan = explain(db, query)
+            scans = full_scans(plan, dialect)
+            print(f"[{'FAIL' if scans else ' OK '}] {name}")
+            for line in plan:
+                print(f"         {line}")
+            failures += bool(scans)
+        if args.database_url:
+            db.drop_all()
+
+    print(f"\n{failures} route quer{'y' if failures == 1 else 'ies'} fell back to a full table scan.")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
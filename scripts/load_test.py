@@ -0,0 +1,113 @@
+"""
+Load test for a running instance.
+
+Logs in once, then hammers a set of pages from N concurrent clients for a
+fixed time and reports throughput, latency percentiles and errors. Pass
+several concurrency levels to see where the server saturates, and rerun
+with different pool/worker settings to compare them, e.g.:
+
+    DB_POOL_SIZE=5 DB_MAX_OVERFLOW=5 GUNICORN_THREADS=4 gunicorn wsgi:app
+    python scripts/load_test.py --username demo --password demo --concurrency 4,16,64
+
+    DB_POOL_SIZE=10 DB_MAX_OVERFLOW=0 GUNICORN_THREADS=10 gunicorn wsgi:app
+    python scripts/load_test.py --username demo --password demo --concurrency 4,16,64
+
+Only the standard library is used so it runs from any machine.
+"""
+import argparse
+import http.cookiejar
+import re
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+DEFAULT_PATHS = '/expenses,/revenue,/projects,/report'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--paths', default=DEFAULT_PATHS, help=f'Comma-separated pages (default: {DEFAULT_PATHS}).')
+    parser.add_argument('--concurrency', default='1,8,32', help='Comma-separated client counts to run in turn.')
+    parser.add_argument('--duration', type=float, default=15, help='Seconds per concurrency level.')
+    return parser.parse_args()
+
+
+def login(base_url, username, password):
+    """Returns an opener holding a logged-in session cookie."""
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    page = opener.open(f'{base_url}/login').read().decode()
+    match = re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', page)
+    data = {'username': username, 'password': password}
+    if match:
+        data['csrf_token'] = match.group(1)
+    response = opener.open(f'{base_url}/login', urllib.parse.urlencode(data).encode())
+    if response.url.rstrip('/').endswith('/login'):
+        raise SystemExit('Login failed; check --username and --password.')
+    return opener
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def run_level(opener, urls, clients, duration):
+    """Runs `clients` threads for `duration` seconds; returns (latencies, errors)."""
+    latencies, errors = [], []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(offset):
+        index = offset
+        while time.perf_counter() < deadline:
+            url = urls[index % len(urls)]
+            index += 1
+            started = time.perf_counter()
+            try:
+                with opener.open(url, timeout=60) as response:
+                    response.read()
+                    # A redirect back to /login means the session was lost.
+                    failed = response.url.rstrip('/').endswith('/login')
+            except (urllib.error.URLError, OSError) as e:
+                failed = e
+            elapsed = time.perf_counter() - started
+            with lock:
+                if failed:
+                    errors.append(failed)
+                else:
+                    latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), errors
+
+
+def main():
+    args = parse_args()
+    base_url = args.base_url.rstrip('/')
+    opener = login(base_url, args.username, args.password)
+    urls = [base_url + path.strip() for path in args.paths.split(',') if path.strip()]
+
+    print(f"{'clients':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for clients in (int(level) for level in args.concurrency.split(',')):
+        latencies, errors = run_level(opener, urls, clients, args.duration)
+        print(f"{clients:>8}{len(latencies) / args.duration:>10.1f}"
+              f"{percentile(latencies, 0.50) * 1000:>10.1f}{percentile(latencies, 0.95) * 1000:>10.1f}"
+              f"{percentile(latencies, 0.99) * 1000:>10.1f}{len(errors):>8}")
+        if errors:
+            print(f"{'':>8}first error: {errors[0]!r}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+Startup benchmark.
+
+Imports the app in fresh interpreters, the way each gunicorn worker and
+every `flask` CLI command does, and reports the import time and the peak
+resident memory of the process. It fails if the scientific stack (pandas,
+numpy, statsmodels, scipy) gets loaded at startup, which forecasting.py
+avoids by importing it lazily.
+
+Usage:
+    python scripts/startup_benchmark.py            # measure and check
+    python scripts/startup_benchmark.py --record   # also append to benchmarks/startup.csv
+
+Results are tracked in benchmarks/startup.csv; record a row when a change
+moves the numbers noticeably.
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS = os.path.join(ROOT, 'benchmarks', 'startup.csv')
+HEAVY_MODULES = ('pandas', 'numpy', 'statsmodels', 'scipy')
+
+# Run in the child: import the app and report what it cost.
+PROBE = f"""
+import json, resource, sys, time
+started = time.perf_counter()
+import app
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    'seconds': elapsed,
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'heavy': [name for name in {HEAVY_MODULES!r} if name in sys.modules],
+}}))
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters to start (default: 5).')
+    parser.add_argument('--record', action='store_true', help=f'Append the result to {os.path.relpath(RESULTS, ROOT)}.')
+    parser.add_argument('--note', default='', help='Free-text note stored with --record.')
+    return parser.parse_args()
+
+
+def measure_once():
+    env = dict(os.environ)
+    # Never touch a real database; importing the app does not connect anyway.
+    env['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'startup_benchmark.db')
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=ROOT, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def main():
+    args = parse_args()
+    runs = [measure_once() for _ in range(args.runs)]
+    seconds = statistics.median(run['seconds'] for run in runs)
+    rss_mb = statistics.median(run['rss_mb'] for run in runs)
+    heavy = sorted({name for run in runs for name in run['heavy']})
+
+    print(f"import app: median {seconds:.2f} s over {args.runs} runs, peak RSS {rss_mb:.0f} MB")
+    print(f"heavy modules loaded at startup: {', '.join(heavy) or 'none'}")
+
+    if args.record:
+        os.makedirs(os.path.dirname(RESULTS), exist_ok=True)
+        is_new = not os.path.exists(RESULTS)
+        with open(RESULTS, 'a', newline='') as f:
+            writer = csv.writer(f)
+            if is_new:
+                writer.writerow(['date', 'commit', 'python', 'import_seconds', 'peak_rss_mb', 'heavy_modules', 'note'])
+            writer.writerow([date.today().isoformat(), git_commit(), platform.python_version(),
+                             f'{seconds:.2f}', f'{rss_mb:.0f}', ' '.join(heavy), args.note])
+        print(f"Recorded in {os.path.relpath(RESULTS, ROOT)}.")
+    return 1 if heavy else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""
+Synthetic dataset generator for benchmarks and query checks.
+
+Bulk-inserts users, sellers (with valid GSTNs), projects, expenses and
+revenues, then rebuilds the rollup tables. The data is shaped like real
+usage rather than uniform noise:
+- a few users own most of the rows (user 1 is the busiest account);
+- spending grows over the last two years, is heavier on weekdays and
+  during office hours, and spikes around month end;
+- expense types, quantities and GST rates follow fixed weights, and unit
+  prices are log-normal.
+Every user's password is 'password'.
+
+As a library (used by the other scripts):
+    from synthetic_data import generate, SCALES
+    generate(db, **SCALES['100k'])
+
+Standalone:
+    python scripts/synthetic_data.py --scale 100k --database-url postgresql://.../scratch_db
+
+Never point --database-url at a database holding real data: the script
+drops and recreates all tables.
+"""
+import argparse
+import math
+import os
+import random
+import string
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PASSWORD = 'password'
+HISTORY_DAYS = 730
+BATCH_SIZE = 10_000
+
+# Named dataset sizes, by number of expenses.
+SCALES = {
+    '10k': dict(expenses=10_000, users=20, projects_per_user=5, sellers=200, revenues=500),
+    '100k': dict(expenses=100_000, users=100, projects_per_user=5, sellers=1_000, revenues=5_000),
+    '1m': dict(expenses=1_000_000, users=500, projects_per_user=6, sellers=5_000, revenues=50_000),
+}
+
+EXPENSE_TYPES = {'Software': 30, 'Hardware': 20, 'Travel': 20, 'Services': 15, 'Office Supplies': 10, 'Utilities': 5}
+GST_RATES = {Decimal('0.18'): 70, Decimal('0.12'): 15, Decimal('0.05'): 10, Decimal('0.28'): 5}
+QUANTITIES = {1: 60, 2: 15, 3: 8, 5: 7, 10: 6, 25: 4}
+STATE_CODES = ['01', '06', '07', '08', '09', '19', '24', '27', '29', '32', '33', '36']
+CENTS = Decimal('0.01')
+
+GSTN_ALPHABET = string.digits + string.ascii_uppercase
+
+
+def gstn_checksum(body):
+    """Check character for the first 14 characters of a GSTN."""
+    total = 0
+    for position, char in enumerate(body):
+        product = GSTN_ALPHABET.index(char) * (2 if position % 2 else 1)
+        total += product // 36 + product % 36
+    return GSTN_ALPHABET[(36 - total % 36) % 36]
+
+
+def random_gstn(rng):
+    """A well-formed GSTN: state code, PAN, entity number, 'Z', check character."""
+    pan = (''.join(rng.choices(string.ascii_uppercase, k=5)) + ''.join(rng.choices(string.digits, k=4))
+           + rng.choice(string.ascii_uppercase))
+    body = rng.choice(STATE_CODES) + pan + rng.choice('123456789') + 'Z'
+    return body + gstn_checksum(body)
+
+
+def _day_weights(start):
+    """Relative spending per day: growth over time, weekday and month-end effects."""
+    weights = []
+    for offset in range(HISTORY_DAYS):
+        day = start + timedelta(days=offset)
+        weight = 0.5 + offset / HISTORY_DAYS
+        weight *= (1.0, 1.0, 1.0, 1.0, 0.9, 0.35, 0.15)[day.weekday()]
+        if (day + timedelta(days=3)).month != day.month:
+            weight *= 1.8
+        weights.append(weight)
+    return weights
+
+
+def _timestamps(rng, count, start):
+    days = rng.choices(range(HISTORY_DAYS), weights=_day_weights(start), k=count)
+    # Mostly office hours (mean 13:00), never outside the day.
+    return [start + timedelta(days=day, minutes=min(max(rng.gauss(13 * 60, 150), 0), 24 * 60 - 1))
+            for day in days]
+
+
+def _insert(db, model, rows):
+    for first in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(db.insert(model), rows[first:first + BATCH_SIZE])
+
+
+def generate(db, expenses, users, projects_per_user, sellers, revenues, seed=42):
+    """
+    Inserts the dataset into an empty schema and rebuilds the rollups.
+    Returns {table: rows inserted}.
+    """
+    from werkzeug.security import generate_password_hash
+    from models import User, Seller, Project, Expense, Revenue
+    from aggregates import refresh_project_totals, backfill_daily_totals, rebuild_catalogs
+
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    start = (now - timedelta(days=HISTORY_DAYS)).replace(hour=0, minute=0, second=0)
+
+    # One hash for everyone; hashing per user would dominate small runs.
+    password_hash = generate_password_hash(PASSWORD)
+    _insert(db, User, [
+        {'id': i, 'username': f'user{i}', 'designation': rng.choice(['Engineer', 'Manager', 'Accountant']),
+         'password_hash': password_hash, 'created_at': start}
+        for i in range(1, users + 1)
+    ])
+    gstns = set()
+    while len(gstns) < sellers:
+        gstns.add(random_gstn(rng))
+    _insert(db, Seller, [{'id': i, 'name': f'Seller {i}', 'gstn': gstn} for i, gstn in enumerate(sorted(gstns), 1)])
+
+    projects = [{'id': user_id * projects_per_user - index, 'name': f'Project {user_id}-{index + 1}',
+                 'user_id': user_id}
+                for user_id in range(1, users + 1) for index in range(projects_per_user)]
+    _insert(db, Project, projects)
+
+    # Zipf-like activity: user n does about 1/n of user 1's work, and within
+    # a user the first projects get most of it. Regular sellers recur.
+    user_weights = [1 / user_id for user_id in range(1, users + 1)]
+    project_weights = [1 / (index + 1) for index in range(projects_per_user)]
+    seller_weights = [1 / math.sqrt(seller_id) for seller_id in range(1, sellers + 1)]
+    owners = rng.choices(range(1, users + 1), weights=user_weights, k=expenses)
+    project_index = rng.choices(range(projects_per_user), weights=project_weights, k=expenses)
+    seller_ids = rng.choices(range(1, sellers + 1), weights=seller_weights, k=expenses)
+    types = rng.choices(list(EXPENSE_TYPES), weights=list(EXPENSE_TYPES.values()), k=expenses)
+    gst_rates = rng.choices(list(GST_RATES), weights=list(GST_RATES.values()), k=expenses)
+    quantities = rng.choices(list(QUANTITIES), weights=list(QUANTITIES.values()), k=expenses)
+    created = _timestamps(rng, expenses, start)
+
+    rows = []
+    for i in range(expenses):
+        unit_price = Decimal(str(round(min(rng.lognormvariate(7.5, 1.1), 500_000), 2)))
+        gst_amount = (unit_price * quantities[i] * gst_rates[i]).quantize(CENTS)
+        rows.append({
+            'id': i + 1, 'expense_type': types[i], 'quantity': quantities[i],
+            'item_name': f'{types[i]} item {rng.randint(1, 400)}', 'unit_price': unit_price,
+            'gst_amount': gst_amount, 'total_amount': unit_price * quantities[i] + gst_amount,
+            'invoice_number': f'INV-{created[i]:%Y%m}-{i + 1}', 'seller_id': seller_ids[i],
+            'user_id': owners[i], 'project_id': owners[i] * projects_per_user - project_index[i],
+            'updated_flag': False, 'created_at': created[i],
+        })
+        if len(rows) == BATCH_SIZE:
+            _insert(db, Expense, rows)
+            rows = []
+    _insert(db, Expense, rows)
+
+    owners = rng.choices(range(1, users + 1), weights=user_weights, k=revenues)
+    _insert(db, Revenue, [
+        {'id': i + 1, 'total_estimated_revenue': Decimal(str(round(rng.lognormvariate(12, 1), 2))),
+         'user_id': owner, 'project_id': owner * projects_per_user - rng.randrange(projects_per_user),
+         'created_at': created_at}
+        for i, (owner, created_at) in enumerate(zip(owners, _timestamps(rng, revenues, start)))
+    ])
+
+    refresh_project_totals([project['id'] for project in projects])
+    backfill_daily_totals()
+    rebuild_catalogs()
+    db.session.commit()
+    return {'user': users, 'seller': sellers, 'project': len(projects), 'expense': expenses, 'revenue': revenues}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=sorted(SCALES), default='10k')
+    parser.add_argument('--database-url', help='Scratch database to fill (default: temporary SQLite file).')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    os.environ['DATABASE_URL'] = args.database_url or \
+        'sqlite:///' + os.path.join(tempfile.mkdtemp(), f'synthetic_{args.scale}.db')
+
+    from app import app
+    from models import db
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        counts = generate(db, **SCALES[args.scale])
+        print(f"Generated {', '.join(f'{count} {table}' for table, count in counts.items())} "
+              f"in {db.engine.url.render_as_string(hide_password=True)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""
+Password hashing and login rate limiting.
+
+Hashing is deliberately slow, so a burst of logins can keep every web
+thread busy with it. password_hasher hashes on the request's own thread
+(hashlib's scrypt and PBKDF2 release the GIL, so threads run in parallel)
+but admits only PASSWORD_HASH_WORKERS hashes at a time, fewer than the
+worker's request threads; a request that finds every slot taken fails with
+HasherBusy at once instead of holding its thread in a queue. Stored hashes
+made with older PASSWORD_HASH_METHOD settings are upgraded on the next
+successful login (see needs_rehash).
+
+login_limiter caps failed logins per client IP and per username in a
+sliding window, and is checked before any hashing, so a brute-force burst
+is turned away without costing CPU while a crowd of users signing in from
+one office address is not. Its counters are per worker process, which
+bounds an attacker at workers times the limit.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_HASH_METHOD = 'scrypt:32768:8:1'
+
+
+class HasherBusy(Exception):
+    """Every hashing slot is taken."""
+
+
+class PasswordHasher:
+    """Owns the hashing slots; configured like the other extensions via init_app."""
+
+    def __init__(self):
+        self.method = DEFAULT_HASH_METHOD
+        self.max_workers = min(3, os.cpu_count() or 1)
+        self._slots = threading.BoundedSemaphore(self.max_workers)
+        self._dummy_hash = None
+        self._method_prefix = None
+
+    def init_app(self, app):
+        self.method = app.config.get('PASSWORD_HASH_METHOD', DEFAULT_HASH_METHOD)
+        self.max_workers = app.config.get('PASSWORD_HASH_WORKERS', self.max_workers)
+        # No queue: a waiting request would hold a web thread just as a
+        # running hash does.
+        self._slots = threading.BoundedSemaphore(self.max_workers)
+        self._dummy_hash = self._method_prefix = None
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            return fn(*args)
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        """
+        Checks `password` against `password_hash`. A missing hash (unknown
+        user) is checked against a dummy one, so the response time does not
+        reveal which usernames exist.
+        """
+        if not password_hash:
+            if self._dummy_hash is None:
+                self._dummy_hash = self.hash(os.urandom(16).hex())
+            self._run(check_password_hash, self._dummy_hash, password)
+            return False
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True when `password_hash` was made with other settings than PASSWORD_HASH_METHOD."""
+        if self._method_prefix is None:
+            # werkzeug fills in defaults for a bare 'scrypt' or 'pbkdf2'; read
+            # the full method back from a hash instead of duplicating them.
+            self._method_prefix = self._run(generate_password_hash, '', self.method).split('$', 1)[0]
+        return password_hash.split('$', 1)[0] != self._method_prefix
+
+
+class RateLimiter:
+    """
+    Sliding-window limiter: at most `limit` hits per key within `window`
+    seconds. The least recently used keys are dropped beyond `max_keys`.
+    """
+
+    def __init__(self, limit, window, max_keys=10000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._hits = OrderedDict()
+        self._lock = threading.Lock()
+
+    def retry_after(self, key):
+        """Seconds until `key` may try again; 0 when it is under the limit."""
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.get(key)
+            if not hits:
+                return 0
+            while hits and hits[0] <= now - self.window:
+                hits.popleft()
+            if len(hits) < self.limit:
+                return 0
+            return int(hits[0] + self.window - now) + 1
+
+    def hit(self, key):
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.get(key)
+            if hits is None:
+                hits = self._hits[key] = deque(maxlen=self.limit)
+            hits.append(now)
+            self._hits.move_to_end(key)
+            while len(self._hits) > self.max_keys:
+                self._hits.popitem(last=False)
+
+    def reset(self, key):
+        with self._lock:
+            self._hits.pop(key, None)
+
+
+class LoginLimiter:
+    """
+    Failed logins per client IP and per username, as two RateLimiters.
+    Registrations count against the IP too (see attempted).
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.by_ip = RateLimiter(limit=30, window=300)
+        self.by_user = RateLimiter(limit=5, window=900)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('LOGIN_RATE_LIMIT', True)
+        self.by_ip = RateLimiter(app.config.get('LOGIN_IP_LIMIT', 30), app.config.get('LOGIN_IP_WINDOW', 300))
+        self.by_user = RateLimiter(app.config.get('LOGIN_USER_LIMIT', 5), app.config.get('LOGIN_USER_WINDOW', 900))
+
+    def retry_after(self, ip, username=None):
+        """Seconds the client must wait before this attempt is allowed; 0 to proceed."""
+        if not self.enabled:
+            return 0
+        return max(self.by_ip.retry_after(ip), self.by_user.retry_after(username.lower()) if username else 0)
+
+    def attempted(self, ip):
+        """Counts a registration, which costs a hash whatever its outcome."""
+        if self.enabled:
+            self.by_ip.hit(ip)
+
+    def failed(self, ip, username):
+        if self.enabled:
+            self.by_ip.hit(ip)
+            self.by_user.hit(username.lower())
+
+    def succeeded(self, username):
+        self.by_user.reset(username.lower())
+
+
+password_hasher = PasswordHasher()
+login_limiter = LoginLimiter()
@@ -1,4 +1,30 @@
+"""
+Web entry point (`gunicorn wsgi:app`).
+Queries made while serving requests are capped by a PostgreSQL statement
+timeout. It is applied here rather than in config.py, so `flask db upgrade`
+and the rebuild/archive commands, which share the app's engine settings,
+can run for as long as a large database needs.
+"""
+import os
+from sqlalchemy import event
 from app import app
+from models import db
+
+# Milliseconds; 0 disables the limit.
+STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS') or 30000)
+
+
+def _set_statement_timeout(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f'SET statement_timeout = {STATEMENT_TIMEOUT_MS}')
+    cursor.close()
+    # Committed, so the pool's rollback on checkin does not undo the SET.
+    dbapi_connection.commit()
+
+
+with app.app_context():
+    if STATEMENT_TIMEOUT_MS and db.engine.dialect.name == 'postgresql':
+        event.listen(db.engine, 'connect', _set_statement_timeout)
 
 if __name__ == "__main__":
-    app.run()
\ No newline at end of file
+    app.run()